@@ -0,0 +1,55 @@
+"""create users and todos tables
+
+Revision ID: 3f1c2a9b7d10
+Revises: 
+Create Date: 2026-10-18 18:33:15.466124
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9b7d10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created by the app before Alembic (create_all) already have these exact tables;
+    # adopt them instead of failing, so `alembic upgrade head` needs no stamp first
+    existing = set() if context.is_offline_mode() else set(sa.inspect(op.get_bind()).get_table_names())
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_name", sa.String(), nullable=True),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("hashed_password", sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("user_name"),
+        )
+        op.create_index("ix_users_id", "users", ["id"], unique=False)
+    if "todos" not in existing:
+        op.create_table(
+            "todos",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("title", sa.String(), nullable=True),
+            sa.Column("description", sa.String(), nullable=True),
+            sa.Column("priority", sa.Integer(), nullable=True),
+            sa.Column("complete", sa.Boolean(), nullable=True),
+            sa.Column("owner_id", sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_todos_id", "todos", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_id", table_name="todos")
+    op.drop_table("todos")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,27 @@
+"""add todo stats version
+
+Revision ID: 4a6c8e0b2d13
+Revises: e2a4c6b8d0f1
+Create Date: 2026-10-18 18:48:12.508028
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a6c8e0b2d13'
+down_revision: Union[str, None] = 'e2a4c6b8d0f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("todo_stats", sa.Column("version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("todo_stats") as batch_op:
+        batch_op.drop_column("version")
@@ -0,0 +1,41 @@
+"""add todo revisions and tombstones
+
+Revision ID: 7d9f1b3c5e27
+Revises: 4a6c8e0b2d13
+Create Date: 2026-10-18 18:49:49.957793
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d9f1b3c5e27'
+down_revision: Union[str, None] = '4a6c8e0b2d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows start at revision 0, so a client syncing without `since` still gets them
+    op.add_column("todos", sa.Column("revision", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("todos", sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_todos_owner_id_revision_id", "todos", ["owner_id", "revision", "id"], unique=False)
+    op.create_table(
+        "todo_tombstones",
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("revision", sa.Integer(), nullable=False),
+        sa.Column("todo_id", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("owner_id", "revision", "todo_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("todo_tombstones")
+    op.drop_index("ix_todos_owner_id_revision_id", table_name="todos")
+    with op.batch_alter_table("todos") as batch_op:
+        batch_op.drop_column("updated_at")
+        batch_op.drop_column("revision")
@@ -0,0 +1,37 @@
+"""add owner scoped todo indexes
+
+Revision ID: 8b4e6d2f1a37
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 18:33:16.034522
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4e6d2f1a37'
+down_revision: Union[str, None] = '3f1c2a9b7d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # if_not_exists keeps this safe on databases built by metadata.create_all
+    op.create_index(
+        "ix_todos_owner_id_id", "todos", ["owner_id", "id"], unique=False, if_not_exists=True
+    )
+    op.create_index(
+        "ix_todos_owner_id_complete_priority", "todos", ["owner_id", "complete", "priority"],
+        unique=False, if_not_exists=True
+    )
+    op.create_index(
+        "ix_users_user_name", "users", ["user_name"], unique=True, if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_user_name", table_name="users", if_exists=True)
+    op.drop_index("ix_todos_owner_id_complete_priority", table_name="todos", if_exists=True)
+    op.drop_index("ix_todos_owner_id_id", table_name="todos", if_exists=True)
@@ -0,0 +1,30 @@
+"""add user token epoch
+
+Revision ID: 9c1e3a5b7d42
+Revises: 7d9f1b3c5e27
+Create Date: 2026-10-18 19:24:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1e3a5b7d42'
+down_revision: Union[str, None] = '7d9f1b3c5e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tokens issued so far carry no epoch claim and count as epoch 0, so they stay valid
+    op.add_column("users", sa.Column("token_epoch", sa.Integer(), nullable=False, server_default="0"))
+    op.create_index("ix_users_token_epoch", "users", ["token_epoch"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_token_epoch", table_name="users")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("token_epoch")
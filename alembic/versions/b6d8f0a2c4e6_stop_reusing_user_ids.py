@@ -0,0 +1,32 @@
+"""stop reusing user ids
+
+Revision ID: b6d8f0a2c4e6
+Revises: 9c1e3a5b7d42
+Create Date: 2026-10-18 20:05:12.318640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d8f0a2c4e6'
+down_revision: Union[str, None] = '9c1e3a5b7d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Without AUTOINCREMENT SQLite hands the highest id out again once that user is deleted, and
+    # a sign-up would inherit the deleted account's tokens and token epoch. PostgreSQL sequences
+    # never go back, so there is nothing to do there. SQLite can only add it by rebuilding the table
+    if op.get_context().dialect.name == "sqlite":
+        with op.batch_alter_table("users", recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+            pass
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "sqlite":
+        with op.batch_alter_table("users", recreate="always", table_kwargs={"sqlite_autoincrement": False}):
+            pass
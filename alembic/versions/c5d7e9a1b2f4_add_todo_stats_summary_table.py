@@ -0,0 +1,55 @@
+"""add todo stats summary table
+
+Revision ID: c5d7e9a1b2f4
+Revises: 8b4e6d2f1a37
+Create Date: 2026-10-18 18:45:05.993662
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d7e9a1b2f4'
+down_revision: Union[str, None] = '8b4e6d2f1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "todo_stats",
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("completed", sa.Integer(), nullable=False),
+        sa.Column("priority_1", sa.Integer(), nullable=False),
+        sa.Column("priority_2", sa.Integer(), nullable=False),
+        sa.Column("priority_3", sa.Integer(), nullable=False),
+        sa.Column("priority_4", sa.Integer(), nullable=False),
+        sa.Column("priority_5", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("owner_id"),
+    )
+    # Backfill from the existing todos; afterwards the write handlers keep it current
+    op.execute(
+        """
+        INSERT INTO todo_stats (owner_id, total, completed, priority_1, priority_2, priority_3, priority_4, priority_5)
+        SELECT owner_id,
+               COUNT(id),
+               SUM(CASE WHEN complete THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 2 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 3 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 4 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN priority = 5 THEN 1 ELSE 0 END)
+        FROM todos
+        WHERE owner_id IS NOT NULL
+        GROUP BY owner_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("todo_stats")
@@ -0,0 +1,33 @@
+"""add user token epoch changed at
+
+Revision ID: d3f5a7c9e1b8
+Revises: b6d8f0a2c4e6
+Create Date: 2026-10-18 21:12:47.905316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f5a7c9e1b8'
+down_revision: Union[str, None] = 'b6d8f0a2c4e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Lets workers reload only the epochs bumped since their last refresh. Users bumped before now
+    # get the upgrade time, so running workers pick them up once more, which does no harm
+    op.add_column("users", sa.Column("token_epoch_changed_at", sa.DateTime(), nullable=True))
+    op.execute("UPDATE users SET token_epoch_changed_at = CURRENT_TIMESTAMP WHERE token_epoch > 0")
+    op.create_index("ix_users_token_epoch_changed_at", "users", ["token_epoch_changed_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_token_epoch_changed_at", table_name="users")
+    # On SQLite this rebuilds the table, which must keep AUTOINCREMENT (see b6d8f0a2c4e6)
+    with op.batch_alter_table("users", table_kwargs={"sqlite_autoincrement": True}) as batch_op:
+        batch_op.drop_column("token_epoch_changed_at")
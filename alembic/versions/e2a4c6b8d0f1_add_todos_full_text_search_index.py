@@ -0,0 +1,82 @@
+"""add todos full text search index
+
+Revision ID: e2a4c6b8d0f1
+Revises: c5d7e9a1b2f4
+Create Date: 2026-10-18 18:45:57.503257
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a4c6b8d0f1'
+down_revision: Union[str, None] = 'c5d7e9a1b2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        # PostgreSQL keeps a weighted tsvector next to the text, computed by the server on every write
+        op.execute(
+            """
+            ALTER TABLE todos ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+            ) STORED
+            """
+        )
+        op.execute("CREATE INDEX ix_todos_search_vector ON todos USING GIN (search_vector)")
+        return
+
+    # External-content FTS5 table: the text lives in todos, the index in todos_fts.
+    # owner_id is indexed too so searches can be scoped to one owner inside FTS5.
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE todos_fts USING fts5(
+            title, description, owner_id,
+            content='todos', content_rowid='id'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER todos_fts_after_insert AFTER INSERT ON todos BEGIN
+            INSERT INTO todos_fts(rowid, title, description, owner_id)
+            VALUES (new.id, new.title, new.description, new.owner_id);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER todos_fts_after_delete AFTER DELETE ON todos BEGIN
+            INSERT INTO todos_fts(todos_fts, rowid, title, description, owner_id)
+            VALUES ('delete', old.id, old.title, old.description, old.owner_id);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER todos_fts_after_update AFTER UPDATE OF title, description, owner_id ON todos BEGIN
+            INSERT INTO todos_fts(todos_fts, rowid, title, description, owner_id)
+            VALUES ('delete', old.id, old.title, old.description, old.owner_id);
+            INSERT INTO todos_fts(rowid, title, description, owner_id)
+            VALUES (new.id, new.title, new.description, new.owner_id);
+        END
+        """
+    )
+    op.execute("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_todos_search_vector")
+        op.execute("ALTER TABLE todos DROP COLUMN IF EXISTS search_vector")
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS todos_fts_after_update")
+    op.execute("DROP TRIGGER IF EXISTS todos_fts_after_delete")
+    op.execute("DROP TRIGGER IF EXISTS todos_fts_after_insert")
+    op.execute("DROP TABLE IF EXISTS todos_fts")
@@ -0,0 +1,49 @@
+"""Load benchmark for the todo read endpoints: sync threadpool path vs the AsyncSession path.
+
+Each mode runs in its own interpreter, inside a scratch directory, so both get a fresh
+todos.db and the TODOS_ASYNC_DB flag is read at import time as it is in production.
+
+    python -m benchmarks.async_vs_sync --todos 2000 --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks.common import migrate, run_in_scratch_dir, run_load, seed
+
+
+def run_child(args):
+    migrate()
+    from main import app
+
+    user_id, token = seed(args.todos)
+
+    async def list_todos(client, n):
+        return await client.get(f"/{user_id}/todos", params={"token": token, "limit": args.page_size})
+
+    print(json.dumps(asyncio.run(run_load(app, list_todos, args.requests, args.concurrency))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--todos", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    argv = ["--todos", args.todos, "--requests", args.requests, "--concurrency", args.concurrency,
+            "--page-size", args.page_size]
+    print(json.dumps({
+        "sync": run_in_scratch_dir("benchmarks.async_vs_sync", argv, {"TODOS_ASYNC_DB": "0"}),
+        "async": run_in_scratch_dir("benchmarks.async_vs_sync", argv, {"TODOS_ASYNC_DB": "1"}),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Cold-start time of a worker: fresh interpreters importing the app and serving a first request.
+
+Each run is a new process in the same scratch directory (migrated once beforehand), reporting
+the time to import main, to run the lifespan startup (the schema revision check), and to
+answer the first /readyz. The process wall time includes interpreter start-up. Medians
+over --runs are printed as JSON.
+
+    python -m benchmarks.cold_start --runs 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import ROOT, migrate
+
+
+def run_child():
+    started = time.perf_counter()
+    from main import app
+    imported = time.perf_counter()
+
+    async def start_and_serve():
+        import httpx
+
+        async with app.router.lifespan_context(app):
+            ready = time.perf_counter()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                response = await client.get("/readyz")
+            response.raise_for_status()
+            return ready, time.perf_counter()
+
+    ready, served = asyncio.run(start_and_serve())
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "first_request_ms": (served - ready) * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    samples = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        migrate()
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-m", "benchmarks.cold_start", "--child"], env=env,
+                                       capture_output=True, text=True, check=True)
+            sample = json.loads(completed.stdout.strip().splitlines()[-1])
+            sample["process_ms"] = (time.perf_counter() - started) * 1000
+            samples.append(sample)
+        os.chdir(ROOT)
+
+    print(json.dumps({
+        "runs": args.runs,
+        **{f"median_{name}": round(statistics.median(sample[name] for sample in samples), 2) for name in samples[0]},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Helpers shared by the benchmark scripts."""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def migrate():
+    """Bring the database in the current directory to the Alembic head, as a deployment would."""
+    from alembic import command
+    from schema import alembic_config
+
+    command.upgrade(alembic_config(), "head")
+
+
+def seed(todo_count, user_name="bench_user"):
+    """Create one user owning todo_count todos; return (user_id, token)."""
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models import Users, Todos
+    from utils import get_jwt_token
+
+    db = SessionLocal()
+    try:
+        user = Users(user_name=user_name, email=f"{user_name}@example.com", hashed_password="not-used")
+        db.add(user)
+        db.commit()
+        batch_size = 10000
+        for start in range(0, todo_count, batch_size):
+            db.execute(insert(Todos), [
+                {"title": f"todo {i}", "description": "benchmark", "priority": i % 5 + 1,
+                 "complete": i % 2 == 0, "owner_id": user.id}
+                for i in range(start, min(start + batch_size, todo_count))
+            ])
+        db.commit()
+        return user.id, get_jwt_token(user.user_name, user.id, timedelta(minutes=20))
+    finally:
+        db.close()
+
+
+async def run_load(app, send_request, total_requests, concurrency):
+    """Issue total_requests calls of send_request(client, n) from concurrency workers and summarise them."""
+    import httpx
+
+    latencies = []
+    statuses = {}
+    counter = iter(range(total_requests))
+
+    async def worker(client):
+        for n in counter:
+            started = time.perf_counter()
+            response = await send_request(client, n)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total_requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "statuses": statuses,
+    }
+
+
+def run_in_scratch_dir(module, argv, env=None):
+    """Run `python -m module --child argv` in a fresh temporary directory and return its JSON output.
+
+    Settings are read from the environment at import time, so comparing two configurations
+    needs two interpreters; the scratch directory gives each run its own todos.db.
+    """
+    child_env = dict(os.environ, **(env or {}))
+    # Load generators are one client hammering the app; measure the app, not the rate limiter
+    child_env.setdefault("TODOS_RATE_LIMIT_BACKEND", "none")
+    child_env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, child_env.get("PYTHONPATH")]))
+    command = [sys.executable, "-m", module, "--child", *map(str, argv)]
+    with tempfile.TemporaryDirectory() as workdir:
+        completed = subprocess.run(command, cwd=workdir, env=child_env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
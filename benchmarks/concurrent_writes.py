@@ -0,0 +1,50 @@
+"""Concurrent-write benchmark for POST /{user_id}/todos under each SQLite engine profile.
+
+Each profile runs in its own interpreter against a fresh todos.db; failed requests
+(HTTP 500) are mostly "database is locked" errors.
+
+    python -m benchmarks.concurrent_writes --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks.common import migrate, run_in_scratch_dir, run_load, seed
+
+
+def run_child(args):
+    migrate()
+    from main import app
+
+    user_id, token = seed(0)
+
+    async def create_todo(client, n):
+        return await client.post(
+            f"/{user_id}/todos", params={"token": token},
+            json={"title": f"todo {n}", "description": "benchmark", "priority": n % 5 + 1}
+        )
+
+    print(json.dumps(asyncio.run(run_load(app, create_todo, args.requests, args.concurrency))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    argv = ["--requests", args.requests, "--concurrency", args.concurrency]
+    print(json.dumps({
+        profile: run_in_scratch_dir("benchmarks.concurrent_writes", argv, {"TODOS_DB_PROFILE": profile})
+        for profile in args.profiles
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
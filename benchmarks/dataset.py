@@ -0,0 +1,79 @@
+"""Seeded dataset generator: fills todos.db with users and todos through the models.
+
+The same --seed always produces the same users, titles, priorities and completion flags.
+Run `alembic upgrade head` first so the stats and full-text search tables exist.
+
+    python -m benchmarks.dataset --users 100 --todos-per-user 200 --seed 0
+"""
+import argparse
+import random
+
+WORDS = (
+    "buy", "call", "clean", "email", "fix", "pay", "plan", "read", "review", "write",
+    "groceries", "invoice", "report", "garden", "kitchen", "meeting", "dentist", "taxes", "car", "books",
+)
+PASSWORD = "benchmark"
+BATCH_SIZE = 10000
+
+
+def seed_dataset(db, users, todos_per_user, seed=0, password=PASSWORD, user_prefix="user"):
+    """Insert users and their todos; return [{"id", "user_name", "todo_ids"}] in insertion order.
+
+    Every user gets the same password, hashed once, so the login endpoint can be exercised.
+    """
+    from sqlalchemy import insert
+    from hashing import hash_password
+    from models import Users, Todos
+    from sharding import SHARDED, rebalance
+    from todo_stats import rebuild_todo_stats
+
+    rng = random.Random(seed)
+    hashed_password = hash_password(password)
+    user_rows = db.execute(insert(Users).returning(Users.id, Users.user_name), [
+        {"user_name": f"{user_prefix}{n:06d}", "email": f"{user_prefix}{n:06d}@example.com",
+         "hashed_password": hashed_password}
+        for n in range(users)
+    ]).all()
+
+    todos = [
+        {"title": " ".join(rng.sample(WORDS, 3)), "description": " ".join(rng.sample(WORDS, 6)),
+         "priority": rng.randint(1, 5), "complete": rng.random() < 0.3, "owner_id": user_id}
+        for user_id, _ in user_rows
+        for _ in range(todos_per_user)
+    ]
+    todo_ids = {user_id: [] for user_id, _ in user_rows}
+    for start in range(0, len(todos), BATCH_SIZE):
+        rows = db.execute(insert(Todos).returning(Todos.id, Todos.owner_id), todos[start:start + BATCH_SIZE])
+        for todo_id, owner_id in rows:
+            todo_ids[owner_id].append(todo_id)
+
+    rebuild_todo_stats(db)
+    db.commit()
+    if SHARDED:
+        # Everything went into the main database; move each user's todos to their shard (ids are kept)
+        rebalance()
+    return [
+        {"id": user_id, "user_name": user_name, "todo_ids": sorted(todo_ids[user_id])}
+        for user_id, user_name in user_rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--todos-per-user", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        users = seed_dataset(db, args.users, args.todos_per_user, args.seed)
+    finally:
+        db.close()
+    print(f"Seeded {len(users)} users with {args.todos_per_user} todos each (password {PASSWORD!r})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Time-to-first-byte, total time and peak Python memory of the streaming todo export.
+
+Runs against a scratch todos.db in a temporary directory, driving the ASGI app directly so
+the time of the first body chunk is observed exactly (httpx's ASGITransport buffers bodies).
+
+    python -m benchmarks.export_stream --todos 200000 --format ndjson
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def call(app, path, query):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": urlencode(query).encode(),
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    timings = {"first_byte": None, "bytes": 0, "status": None}
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # StreamingResponse polls for a disconnect while it streams; only report one at the end
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            timings["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if timings["first_byte"] is None:
+                timings["first_byte"] = time.perf_counter()
+            timings["bytes"] += len(message["body"])
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            response_done.set()
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    finished = time.perf_counter()
+    return {
+        "status": timings["status"],
+        "bytes": timings["bytes"],
+        "ttfb_ms": round(((timings["first_byte"] or finished) - started) * 1000, 2),
+        "total_ms": round((finished - started) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--todos", type=int, default=200000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--no-trace-memory", action="store_true", help="skip tracemalloc (it slows the run)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        from benchmarks.common import migrate, seed
+        migrate()
+        from main import app
+
+        user_id, token = seed(args.todos)
+        if not args.no_trace_memory:
+            tracemalloc.start()
+        result = asyncio.run(call(app, f"/{user_id}/todos/export", {"token": token, "format": args.format}))
+        if not args.no_trace_memory:
+            result["peak_python_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+            tracemalloc.stop()
+        os.chdir(ROOT)
+
+    result.update({"todos": args.todos, "format": args.format})
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Todo creation with per-request commits vs group commit (TODOS_GROUP_COMMIT) at rising concurrency.
+
+Every (mode, concurrency) pair runs in its own interpreter against a fresh todos.db, with
+writers spread over --users users. Group-commit runs also report the groups the writer
+committed. Note that sync handlers run in AnyIO's threadpool (40 threads by default), which
+caps how many requests, and so how many rows per group, are in flight at once.
+
+    python -m benchmarks.group_commit --requests 5000 --concurrency 50 100 250 500
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks.common import migrate, run_in_scratch_dir, run_load, seed
+
+MODES = {
+    "per_request": {"TODOS_GROUP_COMMIT": "0"},
+    "group_commit": {"TODOS_GROUP_COMMIT": "1"},
+}
+
+
+def run_child(args):
+    migrate()
+    from config import GROUP_COMMIT
+    from main import app
+
+    users = [seed(0, user_name=f"bench_user{n}") for n in range(args.users)]
+
+    async def create_todo(client, n):
+        user_id, token = users[n % len(users)]
+        return await client.post(
+            f"/{user_id}/todos", params={"token": token},
+            json={"title": f"todo {n}", "description": "benchmark", "priority": n % 5 + 1}
+        )
+
+    result = asyncio.run(run_load(app, create_todo, args.requests, args.concurrency[0]))
+    if GROUP_COMMIT:
+        from group_commit import group_commit_stats, stop_writers
+
+        stop_writers()
+        result["groups"] = group_commit_stats()
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 100, 250, 500])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--profile", default="production", help="engine profile from database.SQLITE_PROFILES")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    results = {}
+    for concurrency in args.concurrency:
+        argv = ["--requests", args.requests, "--concurrency", concurrency, "--users", args.users]
+        results[concurrency] = {
+            mode: run_in_scratch_dir("benchmarks.group_commit", argv, {**env, "TODOS_DB_PROFILE": args.profile})
+            for mode, env in MODES.items()
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Serialization microbenchmark for a page of todos, from query to JSON bytes.
+
+Compares the old path (ORM instances, jsonable_encoder, stdlib json), validating the same
+instances through the TodoListResponse model, and the column rows rendered by orjson that
+the list endpoint now uses. Runs against a scratch todos.db in a temporary directory.
+
+    python -m benchmarks.serialization --todos 10000 --rounds 20
+"""
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.common import migrate, run_in_scratch_dir, seed
+
+
+def run_child(args):
+    import orjson
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import select
+    from database import SessionLocal
+    from models import Todos
+    from request_body import TodoListResponse
+    from utils import TODO_COLUMNS
+
+    migrate()
+    user_id, _ = seed(args.todos)
+
+    def orm_jsonable_encoder(db):
+        todos = db.scalars(select(Todos).where(Todos.owner_id == user_id).order_by(Todos.id)).all()
+        return json.dumps(jsonable_encoder({"todos": todos, "next_cursor": None})).encode()
+
+    def orm_response_model(db):
+        todos = db.scalars(select(Todos).where(Todos.owner_id == user_id).order_by(Todos.id)).all()
+        page = TodoListResponse.model_validate({"todos": todos, "next_cursor": None}, from_attributes=True)
+        return page.model_dump_json().encode()
+
+    def rows_orjson(db):
+        rows = db.execute(select(*TODO_COLUMNS).where(Todos.owner_id == user_id).order_by(Todos.id)).all()
+        return orjson.dumps({"todos": [row._asdict() for row in rows], "next_cursor": None})
+
+    results = {}
+    for name, render in [
+        ("orm_jsonable_encoder", orm_jsonable_encoder),
+        ("orm_response_model", orm_response_model),
+        ("rows_orjson", rows_orjson),
+    ]:
+        timings = []
+        for _ in range(args.rounds):
+            # A fresh session per round, as each request gets one; no identity map carries over
+            db = SessionLocal()
+            try:
+                started = time.perf_counter()
+                body = render(db)
+                timings.append(time.perf_counter() - started)
+            finally:
+                db.close()
+        results[name] = {
+            "median_ms": round(statistics.median(timings) * 1000, 2),
+            "min_ms": round(min(timings) * 1000, 2),
+            "bytes": len(body),
+        }
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--todos", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    argv = ["--todos", args.todos, "--rounds", args.rounds]
+    print(json.dumps(run_in_scratch_dir("benchmarks.serialization", argv), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Concurrent todo creation by many users with the todo data in 1 to N SQLite shards (TODOS_SHARD_URLS).
+
+Every shard count runs in its own interpreter and scratch directory; 0 is the unsharded
+baseline with a single todos.db. Writers are spread over --users users, so with more
+shards fewer of them wait for the same SQLite write lock.
+
+    python -m benchmarks.sharding --requests 4000 --concurrency 100 --shards 0 2 4 8
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks.common import migrate, run_in_scratch_dir, run_load, seed
+
+
+def run_child(args):
+    migrate()
+    from main import app
+
+    users = [seed(0, user_name=f"bench_user{n}") for n in range(args.users)]
+
+    async def create_todo(client, n):
+        user_id, token = users[n % len(users)]
+        return await client.post(
+            f"/{user_id}/todos", params={"token": token},
+            json={"title": f"todo {n}", "description": "benchmark", "priority": n % 5 + 1}
+        )
+
+    print(json.dumps(asyncio.run(run_load(app, create_todo, args.requests, args.concurrency))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 2, 4, 8])
+    parser.add_argument("--profile", default="production", help="engine profile from database.SQLITE_PROFILES")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    argv = ["--requests", args.requests, "--concurrency", args.concurrency, "--users", args.users]
+    results = {}
+    for shards in args.shards:
+        # Relative paths, so the shard files land in the child's scratch directory
+        shard_urls = ",".join(f"sqlite:///./todos_shard{index}.db" for index in range(shards))
+        results[f"{shards}_shards"] = run_in_scratch_dir(
+            "benchmarks.sharding", argv, {"TODOS_SHARD_URLS": shard_urls, "TODOS_DB_PROFILE": args.profile}
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
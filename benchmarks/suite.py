@@ -0,0 +1,266 @@
+"""Benchmark suite: every endpoint of the todo and user routers against a seeded dataset.
+
+Runs in its own interpreter inside a scratch directory: the schema is created with
+`alembic upgrade head`, benchmarks.dataset seeds it, then each scenario is driven in-process
+through httpx's ASGI transport. Reads run first and destructive scenarios last, so every
+request hits data that exists. Prints throughput and p50/p95/p99 per scenario as JSON.
+
+With --baseline, exits with status 1 when a scenario's p95 rises, or its throughput falls, by
+more than --tolerance against the stored results, or when any request answers 5xx.
+
+    python -m benchmarks.suite --users 50 --todos-per-user 200 --requests 500 --concurrency 20
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from benchmarks.common import migrate, run_in_scratch_dir, run_load
+from benchmarks.dataset import PASSWORD, WORDS
+
+ADMIN_USER_NAME = "amit_sahni"
+BATCH_SIZE = 20
+
+
+def build_scenarios(users, admin, args):
+    """Return [(name, send_request, request_count)] in the order they must run."""
+    live_todos = {user["id"]: list(user["todo_ids"]) for user in users}
+
+    def user_for(n):
+        return users[n % len(users)]
+
+    def params(user, **extra):
+        return {"token": user["token"], **extra}
+
+    def pop_todo_ids(user, count):
+        ids = live_todos[user["id"]]
+        taken = ids[-count:]
+        del ids[-count:]
+        return taken
+
+    async def get_todo(client, n):
+        user = user_for(n)
+        todo_id = user["todo_ids"][n % len(user["todo_ids"])]
+        return await client.get(f"/{user['id']}/todos/{todo_id}", params=params(user))
+
+    async def list_todos(client, n):
+        user = user_for(n)
+        cursor = user["todo_ids"][(n * 7) % len(user["todo_ids"])]
+        return await client.get(f"/{user['id']}/todos", params=params(user, limit=50, cursor=cursor))
+
+    async def todo_stats(client, n):
+        user = user_for(n)
+        return await client.get(f"/{user['id']}/todos/stats", params=params(user))
+
+    async def todo_changes(client, n):
+        user = user_for(n)
+        return await client.get(f"/{user['id']}/todos/changes", params=params(user, since=0, limit=100))
+
+    async def search_todos(client, n):
+        user = user_for(n)
+        return await client.get(f"/{user['id']}/todos/search", params=params(user, q=WORDS[n % len(WORDS)]))
+
+    async def export_todos(client, n):
+        user = user_for(n)
+        return await client.get(f"/{user['id']}/todos/export", params=params(user, format="ndjson"))
+
+    async def create_todo(client, n):
+        user = user_for(n)
+        return await client.post(f"/{user['id']}/todos", params=params(user), json={
+            "title": f"new todo {n}", "description": "created by the benchmark", "priority": n % 5 + 1
+        })
+
+    async def batch_create_todos(client, n):
+        user = user_for(n)
+        return await client.post(f"/{user['id']}/todos/batch", params=params(user), json={"todos": [
+            {"title": f"batch todo {n}.{i}", "description": "created by the benchmark", "priority": i % 5 + 1}
+            for i in range(BATCH_SIZE)
+        ]})
+
+    async def update_todo(client, n):
+        user = user_for(n)
+        todo_id = user["todo_ids"][n % len(user["todo_ids"])]
+        return await client.patch(f"/{user['id']}/todos/{todo_id}", params=params(
+            user, title=f"updated {n}", description="updated by the benchmark", priority=n % 5 + 1,
+            complete=n % 2 == 0
+        ))
+
+    async def batch_update_todos(client, n):
+        user = user_for(n)
+        ids = user["todo_ids"]
+        start = (n * BATCH_SIZE) % max(1, len(ids) - BATCH_SIZE)
+        return await client.patch(f"/{user['id']}/todos/batch", params=params(user), json={"todos": [
+            {"id": todo_id, "complete": n % 2 == 0} for todo_id in ids[start:start + BATCH_SIZE]
+        ]})
+
+    async def delete_todo(client, n):
+        user = user_for(n)
+        todo_id, = pop_todo_ids(user, 1)
+        return await client.delete(f"/{user['id']}/todos/{todo_id}", params=params(user))
+
+    async def batch_delete_todos(client, n):
+        user = user_for(n)
+        return await client.request("DELETE", f"/{user['id']}/todos/batch", params=params(user),
+                                    json={"ids": pop_todo_ids(user, BATCH_SIZE)})
+
+    async def delete_all_todos(client, n):
+        user = users[n]
+        return await client.delete(f"/{user['id']}/todos", params=params(user))
+
+    async def create_user(client, n):
+        return await client.post("/auth/", json={
+            "user_name": f"signup{n:06d}", "email": f"signup{n:06d}@example.com", "password": PASSWORD
+        })
+
+    async def login(client, n):
+        user = user_for(n)
+        return await client.get("/auth/token", params={"user_name": user["user_name"], "password": PASSWORD})
+
+    async def get_user(client, n):
+        user = user_for(n)
+        return await client.get(f"/auth/{user['id']}", params=params(user))
+
+    async def list_users(client, n):
+        return await client.get("/auth/", params=params(admin, limit=100, with_todo_count=True))
+
+    async def update_user(client, n):
+        user = user_for(n)
+        return await client.patch(f"/auth/{user['id']}", params=params(user),
+                                  json={"email": f"{user['user_name']}.{n}@example.com"})
+
+    async def delete_user(client, n):
+        user = users[n]
+        return await client.delete(f"/auth/{user['id']}", params=params(user))
+
+    # Each user can only lose as many todos as were seeded for it
+    todos_per_user = min(len(user["todo_ids"]) for user in users)
+    deletes = min(args.requests, len(users) * (todos_per_user // 2))
+    batch_deletes = min(args.requests, len(users) * (todos_per_user // 2 // BATCH_SIZE))
+    return [
+        ("get_todo", get_todo, args.requests),
+        ("list_todos", list_todos, args.requests),
+        ("todo_stats", todo_stats, args.requests),
+        ("todo_changes", todo_changes, args.requests),
+        ("search_todos", search_todos, args.requests),
+        ("export_todos", export_todos, args.requests),
+        ("get_user", get_user, args.requests),
+        ("list_users", list_users, args.requests),
+        ("login", login, args.login_requests),
+        ("create_user", create_user, args.login_requests),
+        ("create_todo", create_todo, args.requests),
+        ("batch_create_todos", batch_create_todos, args.requests),
+        ("update_todo", update_todo, args.requests),
+        ("batch_update_todos", batch_update_todos, args.requests),
+        ("update_user", update_user, args.requests),
+        ("delete_todo", delete_todo, deletes),
+        ("batch_delete_todos", batch_delete_todos, batch_deletes),
+        ("delete_all_todos", delete_all_todos, len(users)),
+        ("delete_user", delete_user, len(users)),
+    ]
+
+
+def run_child(args):
+    from datetime import timedelta
+
+    migrate()
+    from main import app
+    from benchmarks.dataset import seed_dataset
+    from database import SessionLocal
+    from models import Users
+    from utils import get_jwt_token
+
+    db = SessionLocal()
+    try:
+        users = seed_dataset(db, args.users, args.todos_per_user, args.seed)
+        admin_user = Users(user_name=ADMIN_USER_NAME, email="admin@example.com", hashed_password="not-used")
+        db.add(admin_user)
+        db.commit()
+        admin = {"id": admin_user.id, "user_name": ADMIN_USER_NAME}
+    finally:
+        db.close()
+    for user in [*users, admin]:
+        user["token"] = get_jwt_token(user["user_name"], user["id"], timedelta(hours=1))
+
+    results = {}
+    for name, send_request, request_count in build_scenarios(users, admin, args):
+        if args.only and name not in args.only or request_count <= 0:
+            continue
+        results[name] = asyncio.run(run_load(app, send_request, request_count, args.concurrency))
+    print(json.dumps(results))
+
+
+def find_regressions(results, baseline, tolerance):
+    """Compare scenario results with a baseline; return human-readable failures."""
+    failures = []
+    for name, result in results.items():
+        server_errors = sum(count for code, count in result["statuses"].items() if int(code) >= 500)
+        if server_errors:
+            failures.append(f"{name}: {server_errors} requests answered 5xx")
+        expected = baseline.get("scenarios", {}).get(name)
+        if expected is None:
+            continue
+        if result["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            failures.append(f"{name}: p95 {result['p95_ms']} ms vs baseline {expected['p95_ms']} ms")
+        if result["throughput_rps"] < expected["throughput_rps"] * (1 - tolerance):
+            failures.append(
+                f"{name}: throughput {result['throughput_rps']} rps vs baseline {expected['throughput_rps']} rps"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--todos-per-user", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50,
+                        help="requests for the bcrypt-bound sign-up and login scenarios")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4,
+                        help="work factor while benchmarking; production defaults to 12")
+    parser.add_argument("--only", nargs="+", help="run only these scenarios")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--save-baseline", help="write these results to this path")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    argv = ["--users", args.users, "--todos-per-user", args.todos_per_user, "--seed", args.seed,
+            "--requests", args.requests, "--login-requests", args.login_requests, "--concurrency", args.concurrency]
+    if args.only:
+        argv += ["--only", *args.only]
+    report = {
+        "config": {
+            "users": args.users, "todos_per_user": args.todos_per_user, "seed": args.seed,
+            "requests": args.requests, "login_requests": args.login_requests, "concurrency": args.concurrency,
+            "bcrypt_rounds": args.bcrypt_rounds,
+        },
+        "scenarios": run_in_scratch_dir(
+            "benchmarks.suite", argv, {"BCRYPT_ROUNDS": str(args.bcrypt_rounds)}
+        ),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    failures = find_regressions(report["scenarios"], baseline, args.tolerance)
+    if failures:
+        sys.exit("Benchmark regressions:\n  " + "\n  ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
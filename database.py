@@ -1,13 +1,128 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
+from config import DATABASE_URL, DB_PROFILE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, \
+    DB_STATEMENT_TIMEOUT_MS, USE_ASYNC_DB, METRICS_ENABLED, SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN, \
+    MAX_STATEMENTS_PER_REQUEST
+import metrics
+import query_log
 
 
-SQLALCHEMY_DATABASE_URL = 'sqlite:///./todos.db'
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
-)
+SQLALCHEMY_DATABASE_URL = make_url(DATABASE_URL)
+# "sqlite" or "postgresql"; SQL that differs between them branches on this
+DATABASE_BACKEND = SQLALCHEMY_DATABASE_URL.get_backend_name()
+# Driver swapped into the URL for the AsyncSession engine
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# Each profile lists the PRAGMAs run on every new SQLite connection plus the pool sizing,
+# which applies to every backend.
+# WAL lets readers run alongside the single writer, synchronous=NORMAL drops the fsync per
+# commit (WAL is still consistent after a crash, only the last commits can be lost), and
+# busy_timeout makes writers wait for the lock instead of failing with "database is locked".
+SQLITE_PROFILES = {
+    "default": {
+        "pragmas": {},
+        "pool_size": 5,
+        "max_overflow": 10,
+    },
+    "production": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "mmap_size": 268435456,
+            "cache_size": -65536,
+            "temp_store": "MEMORY",
+        },
+        "pool_size": 20,
+        "max_overflow": 10,
+    },
+}
+
+if DB_PROFILE not in SQLITE_PROFILES:
+    raise ValueError(f"Unknown TODOS_DB_PROFILE {DB_PROFILE!r}, expected one of {sorted(SQLITE_PROFILES)}")
+engine_profile = SQLITE_PROFILES[DB_PROFILE]
+pool_size = DB_POOL_SIZE if DB_POOL_SIZE is not None else engine_profile["pool_size"]
+max_overflow = DB_MAX_OVERFLOW if DB_MAX_OVERFLOW is not None else engine_profile["max_overflow"]
+
+
+def engine_options(backend=DATABASE_BACKEND, is_async=False):
+    options = {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        # A server restart or failover leaves dead connections in the pool; SQLite files cannot go away
+        "pool_pre_ping": DB_POOL_PRE_PING if DB_POOL_PRE_PING is not None else backend != "sqlite",
+    }
+    if DB_POOL_RECYCLE is not None:
+        options["pool_recycle"] = DB_POOL_RECYCLE
+    if backend == "postgresql" and DB_STATEMENT_TIMEOUT_MS is not None:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in engine_profile["pragmas"].items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def instrument_engine(sync_engine):
+    if METRICS_ENABLED:
+        metrics.instrument_engine(sync_engine)
+    if SLOW_QUERY_MS is not None or MAX_STATEMENTS_PER_REQUEST is not None:
+        query_log.instrument_engine(sync_engine, SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN)
+
+
+def create_app_engine(url):
+    """Engine with the selected profile's pool and PRAGMAs and the app's instrumentation."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    sync_engine = create_engine(url, poolclass=QueuePool, **engine_options(backend))
+    if backend == "sqlite":
+        event.listen(sync_engine, "connect", apply_pragmas)
+    instrument_engine(sync_engine)
+    return sync_engine
+
+
+def create_app_async_engine(url):
+    """AsyncEngine twin of create_app_engine, on the backend's driver from ASYNC_DRIVERS."""
+    # Imported here so the sync deployment does not need an async driver installed
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"TODOS_ASYNC_DB does not support {backend!r}, expected one of {sorted(ASYNC_DRIVERS)}")
+    async_url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    # aiosqlite defaults to NullPool, which opens a connection (and its thread) per request
+    new_engine = create_async_engine(
+        async_url, poolclass=AsyncAdaptedQueuePool, **engine_options(backend, is_async=True)
+    )
+    if backend == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", apply_pragmas)
+    instrument_engine(new_engine.sync_engine)
+    return new_engine
+
+
+engine = create_app_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = create_app_async_engine(SQLALCHEMY_DATABASE_URL)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
@@ -2,10 +2,10 @@ from fastapi import HTTPException, status
 
 
 class CustomException(HTTPException):
-    def __init__(self, status_code, detail):
+    def __init__(self, status_code, detail, headers=None):
         self.status_code = status_code
         self.detail = detail
-        super().__init__(status_code=self.status_code, detail=self.detail)
+        super().__init__(status_code=self.status_code, detail=self.detail, headers=headers)
 
 
 class DuplicateException(CustomException):
@@ -32,6 +32,10 @@ class NotAdminError(CustomException):
     pass
 
 
+class ServiceUnavailableError(CustomException):
+    pass
+
+
 def invalid_credentials_exception():
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
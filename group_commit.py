@@ -0,0 +1,202 @@
+"""Group commit for todo creation (TODOS_GROUP_COMMIT=1).
+
+Instead of committing on its own, save_todo hands its row to one writer thread and waits.
+The writer collects rows for up to TODOS_GROUP_COMMIT_MS milliseconds or
+TODOS_GROUP_COMMIT_MAX_ROWS rows and writes them in one transaction: one stats upsert per
+owner, one multi-row INSERT and one commit, so on SQLite one write lock and one fsync for
+the whole group. Callers get their new id only after that commit returned, so an
+acknowledged todo is as durable as with per-request commits.
+
+If a group fails, its rows are retried in a transaction each, so a bad row fails alone.
+A caller waits at most TODOS_GROUP_COMMIT_TIMEOUT seconds and then gets 503, so a stuck
+writer cannot hang requests forever; its row is cancelled unless the writer already took it.
+With sharding every shard has its own writer, so shards commit their groups in parallel.
+"""
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from functools import partial
+from fastapi import status
+from sqlalchemy import insert
+from config import GROUP_COMMIT_MS, GROUP_COMMIT_MAX_ROWS, GROUP_COMMIT_TIMEOUT
+from exceptions import ServiceUnavailableError
+from metrics import timed
+from models import Todos
+from response_cache import todo_cache
+from sharding import shard_count, shard_index, shard_session
+from todo_stats import apply_todo_stats_delta, todo_stats_delta
+
+_STOP = object()
+RETRY_AFTER_SECONDS = "1"
+
+
+class GroupCommitWriter:
+
+    def __init__(self, session_factory, max_delay_ms, max_rows, name="todos-group-commit",
+                 timeout=GROUP_COMMIT_TIMEOUT):
+        self.session_factory = session_factory
+        self.name = name
+        self.max_delay = max_delay_ms / 1000
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"groups": 0, "rows": 0, "largest_group": 0, "retried_groups": 0, "failed_rows": 0,
+                       "timed_out": 0}
+
+    def submit(self, owner_id, values):
+        """Queue one todo (column values without owner_id/revision) and block until it is committed; return its id."""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((owner_id, values, future))
+        try:
+            with timed("group_commit"):
+                return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # A row the writer has not taken yet is never written; one it took may still be committed
+            future.cancel()
+            with self._stats_lock:
+                self._stats["timed_out"] += 1
+            raise ServiceUnavailableError(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": RETRY_AFTER_SECONDS}
+            )
+
+    def _ensure_started(self):
+        # Also replaces a writer thread that died
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def stop(self):
+        """Commit what is queued and stop the writer thread."""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _collect(self, first):
+        group, stopping = [first], False
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_rows:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            group.append(item)
+        return group, stopping
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            group, stopping = self._collect(item)
+            # Drops rows whose caller timed out and cancelled them
+            group = [queued for queued in group if queued[2].set_running_or_notify_cancel()]
+            if group:
+                self._commit_group(group)
+            if stopping:
+                return
+
+    def _write(self, group):
+        rows_by_owner = defaultdict(list)
+        for owner_id, values, _ in group:
+            rows_by_owner[owner_id].append(values)
+
+        with self.session_factory() as db:
+            # Owners in a fixed order, so concurrent writers (other workers) lock stats rows in the same order
+            revisions = {
+                owner_id: apply_todo_stats_delta(
+                    db, owner_id, todo_stats_delta((row["complete"], row["priority"]) for row in rows)
+                )
+                for owner_id, rows in sorted(rows_by_owner.items())
+            }
+            ids = db.scalars(
+                insert(Todos).returning(Todos.id, sort_by_parameter_order=True),
+                [{**values, "owner_id": owner_id, "revision": revisions[owner_id]} for owner_id, values, _ in group]
+            ).all()
+            db.commit()
+
+        for owner_id in revisions:
+            todo_cache.invalidate_user(owner_id)
+        return ids
+
+    def _commit_group(self, group):
+        try:
+            ids = self._write(group)
+        except Exception as exc:
+            if len(group) == 1:
+                self._record(group, failed=1)
+                group[0][2].set_exception(exc)
+                return
+            self._retry_one_by_one(group)
+            return
+        self._record(group)
+        for (_, _, future), todo_id in zip(group, ids):
+            future.set_result(todo_id)
+
+    def _retry_one_by_one(self, group):
+        failed = 0
+        for item in group:
+            try:
+                todo_id = self._write([item])
+            except Exception as exc:
+                failed += 1
+                item[2].set_exception(exc)
+            else:
+                item[2].set_result(todo_id[0])
+        self._record(group, failed=failed, retried=True)
+
+    def _record(self, group, failed=0, retried=False):
+        with self._stats_lock:
+            self._stats["groups"] += 1
+            self._stats["rows"] += len(group) - failed
+            self._stats["largest_group"] = max(self._stats["largest_group"], len(group))
+            self._stats["retried_groups"] += retried
+            self._stats["failed_rows"] += failed
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+# One writer per shard (just one without sharding)
+todo_writers = [
+    GroupCommitWriter(
+        partial(shard_session, index), GROUP_COMMIT_MS, GROUP_COMMIT_MAX_ROWS, name=f"todos-group-commit-{index}"
+    )
+    for index in range(shard_count)
+]
+
+
+def submit_todo(owner_id, values):
+    return todo_writers[shard_index(owner_id)].submit(owner_id, values)
+
+
+def stop_writers():
+    for writer in todo_writers:
+        writer.stop()
+
+
+def group_commit_stats():
+    """Stats of all writers added up."""
+    per_writer = [writer.stats() for writer in todo_writers]
+    stats = {name: sum(writer_stats[name] for writer_stats in per_writer) for name in per_writer[0]}
+    stats["largest_group"] = max(writer_stats["largest_group"] for writer_stats in per_writer)
+    stats["mean_group"] = round(stats["rows"] / stats["groups"], 2) if stats["groups"] else 0
+    stats["writers"] = len(todo_writers)
+    return stats
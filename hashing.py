@@ -0,0 +1,146 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from fastapi import status
+from exceptions import ServiceUnavailableError
+from metrics import timed
+
+# bcrypt work factor; every +1 doubles the cost of hashing and verifying
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Processes doing bcrypt work, and how many more calls may wait for one before we shed load
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_POOL_QUEUE_DEPTH = int(os.getenv("PASSWORD_POOL_QUEUE_DEPTH", "32"))
+PASSWORD_POOL_TIMEOUT = float(os.getenv("PASSWORD_POOL_TIMEOUT", "10"))
+RETRY_AFTER_SECONDS = "1"
+# Pool processes must not be forked from the app: a fork copies its threads' locks and open
+# database connections mid-use. forkserver is not available on Windows, so fall back to spawn there
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_POOL_WORKERS + PASSWORD_POOL_QUEUE_DEPTH)
+_stats_lock = threading.Lock()
+_stats = {
+    "submitted": 0,
+    "completed": 0,
+    "rejected": 0,
+    "timed_out": 0,
+    "in_flight": 0,
+    "peak_in_flight": 0,
+}
+
+
+@lru_cache(maxsize=None)
+def _crypt_context(rounds):
+    # passlib is imported on first use (in the pool processes), not when the app starts
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__rounds=rounds)
+
+
+# The two functions below run inside the pool processes, so they must stay module-level
+def _hash(password, rounds):
+    return _crypt_context(rounds).hash(password)
+
+
+def _verify(password, hashed_password):
+    return _crypt_context(BCRYPT_ROUNDS).verify(password, hashed_password)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=PASSWORD_POOL_WORKERS, mp_context=multiprocessing.get_context(POOL_START_METHOD)
+                )
+    return _executor
+
+
+def _on_done(future):
+    _slots.release()
+    with _stats_lock:
+        _stats["in_flight"] -= 1
+        _stats["completed"] += 1
+
+
+def _busy(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+    return ServiceUnavailableError(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please retry shortly",
+        headers={"Retry-After": RETRY_AFTER_SECONDS}
+    )
+
+
+def _submit(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise _busy("rejected")
+
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["in_flight"] += 1
+        _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        _on_done(None)
+        raise
+    # The slot is released when the work finishes, even if the caller stopped waiting for it
+    future.add_done_callback(_on_done)
+    return future
+
+
+def _run_in_pool(fn, *args):
+    future = _submit(fn, *args)
+    try:
+        with timed("bcrypt"):
+            return future.result(timeout=PASSWORD_POOL_TIMEOUT)
+    except FutureTimeoutError:
+        raise _busy("timed_out")
+
+
+async def _run_in_pool_async(fn, *args):
+    # Awaiting the pool holds no thread, so a burst of logins cannot use up the threadpool other routes run on
+    future = _submit(fn, *args)
+    try:
+        with timed("bcrypt"):
+            return await asyncio.wait_for(asyncio.wrap_future(future), PASSWORD_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise _busy("timed_out")
+
+
+def hash_password(password: str) -> str:
+    return _run_in_pool(_hash, password, BCRYPT_ROUNDS)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return _run_in_pool(_verify, password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_pool_async(_hash, password, BCRYPT_ROUNDS)
+
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    return await _run_in_pool_async(_verify, password, hashed_password)
+
+
+def password_pool_stats():
+    capacity = PASSWORD_POOL_WORKERS + PASSWORD_POOL_QUEUE_DEPTH
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update({
+        "workers": PASSWORD_POOL_WORKERS,
+        "capacity": capacity,
+        "queued": max(0, stats["in_flight"] - PASSWORD_POOL_WORKERS),
+        "saturation": round(stats["in_flight"] / capacity, 3),
+    })
+    return stats
@@ -1,13 +1,97 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from router.health import health_router
 from router.todos import todo_router
 from router.user import router
-import models
+from config import USE_ASYNC_DB, METRICS_ENABLED, MAX_STATEMENTS_PER_REQUEST, SCHEMA_CHECK, GROUP_COMMIT, \
+    TOKEN_EPOCH_REFRESH_SECONDS
 from database import engine
+from sharding import shard_engines
+from rate_limit import RATE_LIMIT_BACKEND, RateLimitMiddleware, rate_limiter
+from utils import token_cache, token_epochs
 
-app = FastAPI()
+logger = logging.getLogger("todos")
 
-# This will create the database to appropriate location given in SQLALCHEMY_DATABASE_URL
-models.Base.metadata.create_all(bind=engine)
 
+async def refresh_token_epochs():
+    while True:
+        await asyncio.sleep(TOKEN_EPOCH_REFRESH_SECONDS)
+        try:
+            await run_in_threadpool(token_epochs.refresh)
+        except Exception:
+            logger.exception("Could not refresh token epochs")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # The schema belongs to the Alembic migrations (alembic upgrade head); startup only checks the revision
+    app.state.schema_revision = None
+    if SCHEMA_CHECK:
+        from schema import check_schema_revision
+
+        # Shards run the same migrations, so every database must be at the head
+        for shard_engine in shard_engines:
+            check_schema_revision(shard_engine)
+        app.state.schema_revision = sorted(check_schema_revision(engine))
+    # Tokens revoked before this worker started must be refused from its first request on
+    token_epochs.refresh()
+    refresher = asyncio.create_task(refresh_token_epochs())
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    refresher.cancel()
+    if GROUP_COMMIT:
+        from group_commit import stop_writers
+
+        # Commit the todos still queued before the worker exits
+        stop_writers()
+
+
+# orjson renders every JSON response; it is several times faster than the stdlib encoder
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+app.include_router(health_router)
 app.include_router(router)
 app.include_router(todo_router)
+
+if USE_ASYNC_DB:
+    from router.async_todos import async_todo_router
+
+    # Swap the sync read routes for their async twins in place, so route order is unchanged
+    async_routes = {(route.path, frozenset(route.methods)): route for route in async_todo_router.routes}
+    app.router.routes[:] = [
+        async_routes.get((getattr(route, "path", None), frozenset(getattr(route, "methods", None) or ())), route)
+        for route in app.router.routes
+    ]
+
+if RATE_LIMIT_BACKEND != "none":
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, token_lookup=token_cache.peek)
+
+if METRICS_ENABLED:
+    import metrics
+    from hashing import password_pool_stats
+    from group_commit import group_commit_stats
+    from response_cache import todo_cache
+
+    # Added last, so it wraps the rate limiter and also counts the 429s
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def get_metrics():
+        return PlainTextResponse(metrics.registry.render({
+            "todos_password_pool": password_pool_stats(),
+            "todos_token_cache": token_cache.stats(),
+            "todos_token_epochs": token_epochs.stats(),
+            "todos_response_cache": todo_cache.stats(),
+            "todos_rate_limit": rate_limiter.stats(),
+            **({"todos_group_commit": group_commit_stats()} if GROUP_COMMIT else {}),
+        }), media_type=metrics.CONTENT_TYPE)
+
+if MAX_STATEMENTS_PER_REQUEST is not None:
+    from query_log import StatementCountMiddleware
+
+    app.add_middleware(StatementCountMiddleware, max_statements=MAX_STATEMENTS_PER_REQUEST)
@@ -0,0 +1,68 @@
+"""Maintenance commands, e.g. `python manage.py rebuild-stats [--user-id N]`."""
+import argparse
+from config import SHARD_URLS
+from sharding import rebalance, shard_count, shard_index, shard_session
+from todo_search import rebuild_search_index
+from todo_stats import rebuild_todo_stats
+
+
+def rebuild_stats(args):
+    # Every shard holds its own users' todos and counters
+    shards = range(shard_count) if args.user_id is None else [shard_index(args.user_id)]
+    written = 0
+    for index in shards:
+        db = shard_session(index)
+        try:
+            written += rebuild_todo_stats(db, args.user_id)
+        finally:
+            db.close()
+    print(f"Rebuilt todo stats for {written} user(s)")
+
+
+def rebuild_search(args):
+    for index in range(shard_count):
+        db = shard_session(index)
+        try:
+            rebuild_search_index(db)
+        finally:
+            db.close()
+    print(f"Rebuilt the todos full-text search index in {shard_count} database(s)")
+
+
+def rebalance_shards(args):
+    moved, renumbered = rebalance(args.extra_urls, args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    target = f"their shard of {len(SHARD_URLS)}" if SHARD_URLS else "the main database"
+    print(f"{verb} the todo data of {moved} user(s) to {target}"
+          f"{f', renumbered {renumbered} todo(s) whose ids were taken' if renumbered else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Todos app maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-stats", help="recompute the todo_stats summary table from todos")
+    rebuild.add_argument("--user-id", type=int, default=None, help="only rebuild this user's counters")
+    rebuild.set_defaults(handler=rebuild_stats)
+
+    search = commands.add_parser(
+        "rebuild-search", help="rebuild the full-text index (todos_fts on SQLite, ix_todos_search_vector on PostgreSQL)"
+    )
+    search.set_defaults(handler=rebuild_search)
+
+    shards = commands.add_parser(
+        "rebalance",
+        help="move users' todo data to the shard TODOS_SHARD_URLS maps them to (run with the app stopped, "
+             "after alembic upgrade head)"
+    )
+    shards.add_argument("--from", dest="extra_urls", action="append", default=[], metavar="URL",
+                        help="also move data out of this database, e.g. a shard removed from TODOS_SHARD_URLS")
+    shards.add_argument("--dry-run", action="store_true", help="only count the users that would move")
+    shards.set_defaults(handler=rebalance_shards)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
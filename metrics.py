@@ -0,0 +1,219 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# PlainTextResponse appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+# Upper bounds in seconds, shared by every histogram; +Inf is implied
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Time spent inside a request is split into these phases (group_commit: waiting for the group-commit writer).
+# A request only gets a phase observation for the phases it entered.
+PHASES = ("jwt", "bcrypt", "db", "group_commit")
+UNMATCHED_ROUTE = "unmatched"
+
+# Per-request accumulator of phase seconds, set by the middleware. Starlette copies the
+# context into threadpool calls, so sync handlers and the DB events they trigger see it too.
+_request_phases = ContextVar("request_phases", default=None)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() does a bisect and two additions."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """In-process request metrics, rendered in the Prometheus text format.
+
+    One lock guards everything; each request takes it once, when it finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(Histogram)
+        self.phases = defaultdict(Histogram)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method, route, status_code, seconds, phases):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(method, route, status_code)] += 1
+            self.latency[(method, route)].observe(seconds)
+            for phase, phase_seconds in phases.items():
+                self.phases[(method, route, phase)].observe(phase_seconds)
+
+    def clear(self):
+        with self._lock:
+            self.requests.clear()
+            self.latency.clear()
+            self.phases.clear()
+
+    def render(self, gauges=None):
+        """Render all metrics; gauges maps a metric prefix to a stats dict whose numeric values become gauges."""
+        with self._lock:
+            in_flight = self.in_flight
+            requests = dict(self.requests)
+            latency = {key: _snapshot(histogram) for key, histogram in self.latency.items()}
+            phases = {key: _snapshot(histogram) for key, histogram in self.phases.items()}
+
+        lines = [
+            "# HELP todos_http_requests_in_flight Requests currently being served.",
+            "# TYPE todos_http_requests_in_flight gauge",
+            f"todos_http_requests_in_flight {in_flight}",
+            "# HELP todos_http_requests_total Finished requests by route and status code.",
+            "# TYPE todos_http_requests_total counter",
+        ]
+        for (method, route, status_code), count in sorted(requests.items()):
+            lines.append(
+                f'todos_http_requests_total{{method="{method}",route="{route}",status="{status_code}"}} {count}'
+            )
+        lines += [
+            "# HELP todos_http_request_duration_seconds Request latency by route.",
+            "# TYPE todos_http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(latency.items()):
+            lines += _histogram_lines("todos_http_request_duration_seconds", f'method="{method}",route="{route}"',
+                                      histogram)
+        lines += [
+            "# HELP todos_request_phase_seconds Time per request spent validating JWTs, in bcrypt, in DB calls and "
+            "waiting for group commits; only the phases a request entered are observed.",
+            "# TYPE todos_request_phase_seconds histogram",
+        ]
+        for (method, route, phase), histogram in sorted(phases.items()):
+            labels = f'method="{method}",route="{route}",phase="{phase}"'
+            lines += _histogram_lines("todos_request_phase_seconds", labels, histogram)
+
+        for prefix, stats in (gauges or {}).items():
+            for name, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _snapshot(histogram):
+    return list(histogram.counts), histogram.total, histogram.count
+
+
+def _histogram_lines(name, labels, snapshot):
+    counts, total, count = snapshot
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(BUCKETS, counts):
+        cumulative += bucket_count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines += [
+        f'{name}_bucket{{{labels},le="+Inf"}} {count}',
+        f"{name}_sum{{{labels}}} {total:.6f}",
+        f"{name}_count{{{labels}}} {count}",
+    ]
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+def record_phase(phase, seconds):
+    phases = _request_phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to the current request's phase (no-op outside a request)."""
+    if _request_phases.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    record_phase("db", time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_started"):
+        connection.info["metrics_started"].pop()
+
+
+def instrument_engine(engine):
+    """Count time spent in cursor executions on this (sync) engine towards the "db" phase."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request.
+
+    Routes are labelled with their path template (e.g. /{user_id}/todos), looked up from the
+    endpoint the router matched, so label cardinality stays bounded by the number of routes.
+    """
+
+    def __init__(self, app, metrics=registry):
+        self.app = app
+        self.metrics = metrics
+        self._route_paths = None
+
+    def _route_label(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if self._route_paths is None:
+            self._route_paths = {
+                getattr(route, "endpoint", None): route.path for route in scope["app"].routes
+            }
+        return self._route_paths.get(endpoint, UNMATCHED_ROUTE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        phases = {}
+        token = _request_phases.set(phases)
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.metrics.request_started()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_phases.reset(token)
+            self.metrics.request_finished(scope["method"], self._route_label(scope), status_code, elapsed, phases)
@@ -1,20 +1,60 @@
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey
+from sqlalchemy import Boolean, Column, DateTime, Integer, String, ForeignKey, Index, func
 from database import Base
 
 
 class Users(Base):
     __tablename__ = "users"
+    # Ids of deleted users are never handed out again, so their tokens cannot match a new account
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True, index=True)
-    user_name = Column(String, unique=True)
+    user_name = Column(String, unique=True, index=True)
     email = Column(String)
     hashed_password = Column(String)
+    # Bumped when the password or user name changes; tokens carrying a lower epoch claim are refused
+    token_epoch = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+    # When token_epoch was last bumped, so workers only reload the epochs that changed (see utils.TokenEpochs)
+    token_epoch_changed_at = Column(DateTime, index=True)
 
 
 class Todos(Base):
     __tablename__ = "todos"
+    # Every todo query is scoped by owner_id, so lead the composite indexes with it
+    __table_args__ = (
+        Index("ix_todos_owner_id_id", "owner_id", "id"),
+        Index("ix_todos_owner_id_complete_priority", "owner_id", "complete", "priority"),
+        Index("ix_todos_owner_id_revision_id", "owner_id", "revision", "id"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
     description = Column(String)
     priority = Column(Integer)
     complete = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    # Owner's todo_stats.version at the last write to this row; delta sync pages on it
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class TodoTombstones(Base):
+    """Deleted todos, kept so delta sync can tell offline clients what to remove."""
+    __tablename__ = "todo_tombstones"
+    owner_id = Column(Integer, primary_key=True)
+    revision = Column(Integer, primary_key=True)
+    todo_id = Column(Integer, primary_key=True)
+    deleted_at = Column(DateTime, default=func.now())
+
+
+class TodoStats(Base):
+    """Per-user dashboard counters, kept in step with todos by the write handlers."""
+    __tablename__ = "todo_stats"
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    priority_1 = Column(Integer, nullable=False, default=0)
+    priority_2 = Column(Integer, nullable=False, default=0)
+    priority_3 = Column(Integer, nullable=False, default=0)
+    priority_4 = Column(Integer, nullable=False, default=0)
+    priority_5 = Column(Integer, nullable=False, default=0)
+    # Bumped by every write to the owner's todos; backs the ETags of todo reads
+    version = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,116 @@
+"""Opt-in SQL diagnostics: a slow-query log with query plans and a per-request statement counter.
+
+Statements slower than TODOS_SLOW_QUERY_MS are logged with their parameters and the
+database's plan for them (EXPLAIN QUERY PLAN on SQLite). With TODOS_MAX_STATEMENTS_PER_REQUEST
+set, StatementCountMiddleware counts statements per request and logs requests issuing more
+than that, listing the statements they repeated: the usual shape of an N+1 query.
+"""
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+
+logger = logging.getLogger("todos.sql")
+
+PARAMETERS_LOG_LIMIT = 500
+REPEATED_STATEMENTS_LOGGED = 5
+EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+
+# Counter of statement texts run by the current request, set by StatementCountMiddleware
+_request_statements = ContextVar("request_statements", default=None)
+
+
+def _truncate(value, limit=PARAMETERS_LOG_LIMIT):
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def explain(conn, statement, parameters):
+    """Return the plan of one statement as text lines, run on the connection that executed it."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        # SQLite rows are (id, parent, notused, detail); PostgreSQL returns one text column
+        return [str(row[-1]) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements = _request_statements.get()
+    if statements is not None:
+        statements[statement] += 1
+
+
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_log_started", []).append(time.perf_counter())
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_log_started"):
+        connection.info["query_log_started"].pop()
+
+
+def slow_query_listener(threshold_ms, with_plan=True):
+    """Build an after_cursor_execute listener logging statements slower than threshold_ms."""
+    threshold = threshold_ms / 1000
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_log_started"].pop()
+        if elapsed < threshold:
+            return
+        plan = []
+        # A plan for one parameter set of an executemany would be misleading
+        if with_plan and not executemany and statement.lstrip()[:6].lower().startswith(EXPLAINABLE):
+            try:
+                plan = explain(conn, statement, parameters)
+            except Exception as exc:
+                plan = [f"(no plan: {exc})"]
+        logger.warning(
+            "Slow query (%.1f ms): %s\nparameters: %s%s",
+            elapsed * 1000, statement, _truncate(parameters),
+            "".join(f"\nplan: {line}" for line in plan)
+        )
+
+    return after_cursor_execute
+
+
+def instrument_engine(engine, slow_query_ms=None, with_plan=True):
+    """Attach the statement counter and, with slow_query_ms, the slow-query log to a (sync) engine."""
+    event.listen(engine, "before_cursor_execute", _count_statement)
+    if slow_query_ms is not None:
+        event.listen(engine, "before_cursor_execute", _start_timer)
+        event.listen(engine, "after_cursor_execute", slow_query_listener(slow_query_ms, with_plan))
+        event.listen(engine, "handle_error", _handle_error)
+
+
+class StatementCountMiddleware:
+    """Pure ASGI middleware flagging requests that run more than max_statements statements."""
+
+    def __init__(self, app, max_statements):
+        self.app = app
+        self.max_statements = max_statements
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        statements = Counter()
+        token = _request_statements.set(statements)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_statements.reset(token)
+            total = sum(statements.values())
+            if total > self.max_statements:
+                repeated = [(text, count) for text, count in statements.most_common(REPEATED_STATEMENTS_LOGGED)
+                            if count > 1]
+                logger.warning(
+                    "%s %s ran %d SQL statements (limit %d)%s",
+                    scope["method"], scope["path"], total, self.max_statements,
+                    "".join(f"\n{count}x {text}" for text, count in repeated)
+                )
@@ -0,0 +1,179 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+from config import RATE_LIMIT_BACKEND, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_OVERRIDES
+
+# "METHOD path template" -> (key, requests, per seconds); the first matching rule wins, "*" matches
+# everything else. key "ip" buckets by client address, "user" by the JWT id claim (see RateLimitMiddleware).
+RATE_LIMITS = {
+    "GET /auth/token": ("ip", 10, 60),
+    "POST /auth/": ("ip", 5, 60),
+    "GET /{user_id}/todos/export": ("user", 6, 60),
+    "GET /{user_id}/todos/search": ("user", 60, 60),
+    "GET /{user_id}/todos": ("user", 120, 60),
+    "*": ("user", 600, 60),
+}
+EXEMPT_PATHS = frozenset(["/healthz", "/readyz", "/metrics"])
+
+
+def parse_rate_limits(overrides):
+    """Validate TODOS_RATE_LIMITS overrides into rules; a bad rule fails startup instead of every request."""
+    if not isinstance(overrides, dict):
+        raise ValueError(f"TODOS_RATE_LIMITS must be a JSON object of rules, got {overrides!r}")
+    rules = {}
+    for name, rule in overrides.items():
+        valid = (
+            isinstance(rule, list) and len(rule) == 3 and rule[0] in ("ip", "user")
+            and all(isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0 for value in rule[1:])
+        )
+        if not valid:
+            raise ValueError(
+                f'TODOS_RATE_LIMITS rule {name!r} must be ["ip" or "user", requests, seconds], got {rule!r}'
+            )
+        rules[name] = tuple(rule)
+    return rules
+
+
+# Existing rules keep their position, new ones are added after them and RateLimiter still tries "*" last
+RATE_LIMITS.update(parse_rate_limits(RATE_LIMIT_OVERRIDES))
+
+
+class RateLimitBackend:
+    """Token-bucket store. A shared implementation (e.g. Redis running the same arithmetic in
+    a Lua script) makes the limits hold across workers and nodes."""
+
+    def acquire(self, key, capacity, refill_per_second):
+        """Take one token from the bucket; return 0 when allowed, else seconds until a token is available."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        return 0
+
+
+class NullRateLimitBackend(RateLimitBackend):
+    def acquire(self, key, capacity, refill_per_second):
+        return 0
+
+    def clear(self):
+        pass
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in a bounded LRU; a bucket evicted for space comes back full, which only errs towards allowing."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, capacity, refill_per_second):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / refill_per_second
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """Matches requests to RATE_LIMITS rules and spends tokens from the backend."""
+
+    def __init__(self, backend, limits):
+        self.backend = backend
+        self.rejected = 0
+        self._rules = []
+        # "*" matches everything, so it goes last wherever it is in limits
+        for name, (key, requests, seconds) in sorted(limits.items(), key=lambda item: item[0] == "*"):
+            method, _, path = name.partition(" ")
+            pattern = None if name == "*" else compile_path(path)[0]
+            self._rules.append((name, method, pattern, key, requests, requests / seconds))
+
+    def match(self, method, path):
+        for rule in self._rules:
+            name, rule_method, pattern, *_ = rule
+            if pattern is None or rule_method == method and pattern.match(path):
+                return rule
+        return None
+
+    def check(self, rule, identity):
+        """Return 0 if the request may proceed, else the seconds to wait."""
+        name, _, _, _, capacity, refill_per_second = rule
+        wait = self.backend.acquire(f"{name}:{identity}", capacity, refill_per_second)
+        if wait:
+            self.rejected += 1
+        return wait
+
+    def stats(self):
+        return {"backend": type(self.backend).__name__, "buckets": len(self.backend), "rejected": self.rejected}
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware answering over-limit requests with 429 before routing, so they
+    never reach the database, jose or bcrypt.
+
+    "user" rules bucket by the user id of an already verified token (token_lookup returns its
+    cached claims without verifying anything). Tokens not verified yet, which includes forged
+    ones, fall back to the client address, so minting tokens cannot buy extra buckets.
+    """
+
+    def __init__(self, app, limiter, token_lookup):
+        self.app = app
+        self.limiter = limiter
+        self.token_lookup = token_lookup
+
+    def _identity(self, scope, key):
+        if key == "user":
+            token = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token")
+            claims = self.token_lookup(token[0]) if token else None
+            if claims is not None:
+                return f"user:{claims['user_id']}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.limiter.match(scope["method"], scope["path"])
+        if rule is not None:
+            wait = self.limiter.check(rule, self._identity(scope, rule[3]))
+            if wait:
+                response = JSONResponse(
+                    {"detail": "Too many requests, please retry later"},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(wait))}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+RATE_LIMIT_BACKENDS = {
+    "memory": lambda: InMemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS),
+    "none": NullRateLimitBackend,
+}
+
+rate_limiter = RateLimiter(RATE_LIMIT_BACKENDS[RATE_LIMIT_BACKEND](), RATE_LIMITS)
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field, model_validator
-from typing import Optional
+from typing import List, Optional
 
 
 class TodoRequestSchema(BaseModel):
@@ -9,6 +10,39 @@ class TodoRequestSchema(BaseModel):
     complete: Optional[bool] = False
 
 
+class TodoPatchSchema(BaseModel):
+    id: int = Field(gt=0)
+    title: Optional[str] = Field(None, min_length=3)
+    description: Optional[str] = Field(None, min_length=3, max_length=100)
+    priority: Optional[int] = Field(None, gt=0, lt=6)
+    complete: Optional[bool] = None
+
+    @model_validator(mode='after')
+    def verify_details(self):
+        if not self.model_dump(exclude_none=True, exclude={"id"}):
+            raise ValueError("No data provided to update")
+        return self
+
+
+class TodoBatchCreateSchema(BaseModel):
+    todos: List[TodoRequestSchema] = Field(min_length=1, max_length=500)
+
+
+class TodoBatchUpdateSchema(BaseModel):
+    todos: List[TodoPatchSchema] = Field(min_length=1, max_length=500)
+
+    @model_validator(mode='after')
+    def verify_unique_ids(self):
+        ids = [todo.id for todo in self.todos]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Each todo id may appear only once per batch")
+        return self
+
+
+class TodoBatchDeleteSchema(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=500)
+
+
 class UpdateUserDetails(BaseModel):
     user_name: Optional[str] = Field(None, min_length=4, max_length=25)
     email: Optional[str] = Field(None, min_length=5, max_length=50)
@@ -27,3 +61,34 @@ class UsersDetailsSchema(BaseModel):
     user_name: str = Field(min_length=4, max_length=25, description="This is user name")
     email: str = Field(min_length=5, max_length=50)
     password: str = Field(min_length=4, max_length=25)
+
+
+class TodoResponse(BaseModel):
+    id: int
+    title: str
+    description: str
+    priority: int
+    complete: Optional[bool] = False
+    owner_id: int
+    revision: int
+    updated_at: Optional[datetime] = None
+
+
+class TodoListResponse(BaseModel):
+    todos: List[TodoResponse]
+    next_cursor: Optional[int] = None
+
+
+class UserResponse(BaseModel):
+    id: int
+    user_name: str
+    email: str
+
+
+class UserSummaryResponse(UserResponse):
+    todo_count: Optional[int] = None
+
+
+class UserListResponse(BaseModel):
+    users: List[UserSummaryResponse]
+    next_cursor: Optional[int] = None
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from config import CACHE_BACKEND, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS
+
+
+class CacheBackend:
+    """What the response cache needs from a store. A Redis or Memcached client maps onto it directly."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def incr(self, key):
+        """Atomically add one to an integer key (missing counts as 0) and return the new value."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        return 0
+
+
+class NullCacheBackend(CacheBackend):
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+
+class LRUCacheBackend(CacheBackend):
+    """In-process LRU with per-entry TTL, shared by the threads of one worker."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value, _ = self._entries.get(key, (0, None))
+            self._entries[key] = (value + 1, None)
+            self._entries.move_to_end(key)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalSharedCacheBackend(LRUCacheBackend):
+    """Local stand-in for a shared store: values are serialised on the way in and out like
+    they would be over the network, so code that works against it works against Redis."""
+
+    def get(self, key):
+        value = super().get(key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl):
+        super().set(key, json.dumps(value), ttl)
+
+    def incr(self, key):
+        with self._lock:
+            value, _ = self._entries.get(key, ("0", None))
+            value = str(int(value) + 1)
+            self._entries[key] = (value, None)
+            self._entries.move_to_end(key)
+            return int(value)
+
+
+class ResponseCache:
+    """Read-through cache for per-user todo responses.
+
+    Keys embed a per-user generation number that lives in the backend itself, so a write
+    invalidates exactly that user's entries with one incr and a hit needs no database access.
+    The generation key is touched on every lookup and write, so under LRU pressure it always
+    outlives the entries built on it and can never reset underneath them.
+    """
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, user_id, request):
+        generation = self.backend.get(f"todos:gen:{user_id}") or 0
+        query = sorted((key, value) for key, value in request.query_params.multi_items() if key != "token")
+        digest = hashlib.sha256(f"{request.url.path}?{query}".encode()).hexdigest()[:32]
+        return f"todos:{user_id}:{generation}:{digest}"
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def set(self, key, body, etag):
+        self.backend.set(key, {"body": body, "etag": etag}, self.ttl)
+
+    def invalidate_user(self, user_id):
+        """Call after the write has committed, so a concurrent read cannot re-cache the old rows."""
+        self.backend.incr(f"todos:gen:{user_id}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "evictions": getattr(self.backend, "evictions", 0),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+CACHE_BACKENDS = {
+    "lru": lambda: LRUCacheBackend(CACHE_MAX_ENTRIES),
+    "shared": lambda: LocalSharedCacheBackend(CACHE_MAX_ENTRIES),
+    "none": NullCacheBackend,
+}
+
+todo_cache = ResponseCache(CACHE_BACKENDS[CACHE_BACKEND](), CACHE_TTL_SECONDS)
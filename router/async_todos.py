@@ -0,0 +1,99 @@
+from fastapi import APIRouter, status
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Path, Query, Request, Response
+from request_body import TodoResponse, TodoListResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from exceptions import ValidateTokenError, InvalidCredentialsException
+from response_cache import todo_cache
+from router.todos import NOT_MODIFIED, CACHE_CONTROL, cached_todo_response, todo_json_response
+from todo_stats import todo_version_statement
+from utils import get_async_db, validate_user_id_and_token, todos_page_statement, todo_statement, split_page, \
+    todo_etag, etag_matches
+
+# Async twins of the todo read endpoints. When TODOS_ASYNC_DB is set, main.py swaps these
+# in for the threadpool-bound sync routes with the same path and method.
+async_todo_router = APIRouter(
+    tags=["Todos"]
+)
+
+
+@async_todo_router.get("/{user_id}/todos/{todo_id}", status_code=status.HTTP_200_OK, response_model=List[TodoResponse])
+async def get_particular_todo(
+        request: Request,
+        token: str,
+        user_id: int = Path(gt=0),
+        todo_id: int = Path(gt=0),
+        db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        cache_key = todo_cache.key(user_details.get("user_id"), request)
+        cached = todo_cache.get(cache_key)
+        if cached is not None:
+            return cached_todo_response(request, cached)
+
+        version = await db.scalar(todo_version_statement(user_details.get("user_id"))) or 0
+        etag = todo_etag(user_details.get("user_id"), version, request)
+        if etag_matches(request, etag):
+            return Response(status_code=NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        result = (await db.execute(todo_statement(todo_id, user_details.get("user_id")))).all()
+        return todo_json_response([row._asdict() for row in result], etag, cache_key)
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An error occurred while fetching details'
+        )
+
+
+@async_todo_router.get("/{user_id}/todos", status_code=status.HTTP_200_OK, response_model=TodoListResponse)
+async def get_all_todos(
+        request: Request,
+        token: str,
+        user_id: int = Path(gt=0),
+        limit: int = Query(default=50, gt=0, le=500),
+        cursor: Optional[int] = Query(default=None, gt=0, description="id of the last todo of the previous page"),
+        complete: Optional[bool] = Query(default=None),
+        min_priority: Optional[int] = Query(default=None, gt=0, lt=6),
+        max_priority: Optional[int] = Query(default=None, gt=0, lt=6),
+        title_prefix: Optional[str] = Query(default=None, min_length=1, description="case-insensitive title prefix"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        cache_key = todo_cache.key(user_details.get("user_id"), request)
+        cached = todo_cache.get(cache_key)
+        if cached is not None:
+            return cached_todo_response(request, cached)
+
+        version = await db.scalar(todo_version_statement(user_details.get("user_id"))) or 0
+        etag = todo_etag(user_details.get("user_id"), version, request)
+        if etag_matches(request, etag):
+            return Response(status_code=NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        statement = todos_page_statement(
+            user_details.get("user_id"), limit, cursor, complete, min_priority, max_priority, title_prefix
+        )
+        result, next_cursor = split_page((await db.execute(statement)).all(), limit)
+        return todo_json_response(
+            {"todos": [row._asdict() for row in result], "next_cursor": next_cursor}, etag, cache_key
+        )
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An error occurred while fetching details'
+        )
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Request, status
+from sqlalchemy import text
+from sharding import all_engines
+from exceptions import ServiceUnavailableError
+
+# Probes for the process manager: /healthz answers as long as the process serves requests,
+# /readyz only once startup (the schema check) finished and the database (every shard) answers.
+health_router = APIRouter(
+    tags=["Health"]
+)
+
+
+@health_router.get("/healthz", status_code=status.HTTP_200_OK)
+def get_health():
+    return {"status": "ok"}
+
+
+@health_router.get("/readyz", status_code=status.HTTP_200_OK)
+def get_readiness(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        raise ServiceUnavailableError(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Application is starting"
+        )
+    try:
+        for engine in all_engines():
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+    except Exception:
+        raise ServiceUnavailableError(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is unreachable"
+        )
+    return {"status": "ready", "schema_revision": request.app.state.schema_revision}
@@ -1,18 +1,89 @@
+import csv
+import io
+import json
+from collections import Counter
 from fastapi import APIRouter, status
-from typing import Optional
-from fastapi import Depends, HTTPException, Path, Query
-from sqlalchemy import and_
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Path, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import and_, bindparam, delete, insert, select, update
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import Session
-from exceptions import ValidateTokenError, NoRecordFound, InvalidCredentialsException
+from exceptions import ValidateTokenError, NoRecordFound, InvalidCredentialsException, ServiceUnavailableError
+from config import GROUP_COMMIT
+from group_commit import submit_todo
 from models import Todos
-from request_body import TodoRequestSchema
-from utils import get_db, get_todo, validate_user_id_and_token
+from todo_search import search_todos
+from todo_sync import get_todo_changes, parse_sync_cursor, record_tombstones, tombstone_all_todos
+from todo_stats import add_todo_stats, apply_todo_stats_delta, get_todo_stats, get_todo_version, lock_todo_stats, \
+    reset_todo_stats, todo_stats_delta
+from response_cache import todo_cache
+from sharding import user_session
+from request_body import TodoRequestSchema, TodoBatchCreateSchema, TodoBatchUpdateSchema, TodoBatchDeleteSchema, \
+    TodoResponse, TodoListResponse
+from utils import get_db, validate_user_id_and_token, todos_page_statement, todo_statement, split_page, todo_etag, \
+    etag_matches
 
 todo_router = APIRouter(
     tags=["Todos"]
 )
 
+NOT_MODIFIED = status.HTTP_304_NOT_MODIFIED
+# Clients may keep responses but must revalidate them with If-None-Match every time
+CACHE_CONTROL = "private, no-cache"
+
+def todo_json_response(content, etag, cache_key=None):
+    """Render a todo read straight to JSON with orjson, caching the rendered body under cache_key.
+
+    Returning a Response skips FastAPI's response_model validation and jsonable_encoder pass;
+    the handlers build content from column rows that already match the response schema.
+    """
+    response = ORJSONResponse(content, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    if cache_key is not None:
+        todo_cache.set(cache_key, response.body.decode(), etag)
+    return response
+
+
+def cached_todo_response(request, cached):
+    """Answer a read from a response cache entry, without touching the database."""
+    headers = {"ETag": cached["etag"], "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, cached["etag"]):
+        return Response(status_code=NOT_MODIFIED, headers=headers)
+    return Response(cached["body"], media_type="application/json", headers=headers)
+
+
+EXPORT_COLUMNS = ("id", "title", "description", "priority", "complete")
+EXPORT_ROWS_PER_CHUNK = 1000
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _export_chunks(owner_id, export_format):
+    # The request's session is closed before the body is streamed, so the export owns its session
+    db = user_session(owner_id)
+    try:
+        result = db.execute(
+            select(*(getattr(Todos, column) for column in EXPORT_COLUMNS))
+            .where(Todos.owner_id == owner_id)
+            .order_by(Todos.id)
+            .execution_options(yield_per=EXPORT_ROWS_PER_CHUNK)
+        )
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            for rows in result.partitions():
+                yield "".join(json.dumps(dict(row._mapping)) + "\n" for row in rows)
+    finally:
+        db.close()
+
 
 @todo_router.post("/{user_id}/todos", status_code=status.HTTP_201_CREATED)
 def save_todo(
@@ -23,11 +94,66 @@ def save_todo(
 ):
     try:
         user_details = validate_user_id_and_token(token, user_id)
-        todos = Todos(**details.model_dump(), owner_id=user_details.get('user_id'))
+        if GROUP_COMMIT:
+            # Committed together with other requests' todos by the writer thread
+            todo_id = submit_todo(user_details.get('user_id'), details.model_dump())
+            return {"message": "Todo created!", "id": todo_id}
+
+        revision = apply_todo_stats_delta(
+            db, user_details.get('user_id'), todo_stats_delta([(details.complete, details.priority)])
+        )
+        todos = Todos(**details.model_dump(), owner_id=user_details.get('user_id'), revision=revision)
         db.add(todos)
+        db.flush()
+        todo_id = todos.id
+        db.commit()
+        todo_cache.invalidate_user(user_details.get("user_id"))
+
+        return {"message": "Todo created!", "id": todo_id}
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except ServiceUnavailableError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while saving details to db"
+        )
+
+
+# Fixed sub-paths (batch, stats, changes, search, export) must stay above the /{user_id}/todos/{todo_id} routes,
+# which would otherwise match them as a todo_id
+@todo_router.post("/{user_id}/todos/batch", status_code=status.HTTP_201_CREATED)
+def save_todos_batch(
+        details: TodoBatchCreateSchema,
+        user_id: int = Path(gt=0),
+        token: str = Query(),
+        db: Session = Depends(get_db)
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        revision = apply_todo_stats_delta(
+            db, user_details.get("user_id"), todo_stats_delta((todo.complete, todo.priority) for todo in details.todos)
+        )
+        rows = [
+            {**todo.model_dump(), "owner_id": user_details.get("user_id"), "revision": revision}
+            for todo in details.todos
+        ]
+        # One executemany-style INSERT for the whole batch, ids come back in input order
+        ids = db.scalars(
+            insert(Todos).returning(Todos.id, sort_by_parameter_order=True),
+            rows
+        ).all()
         db.commit()
+        todo_cache.invalidate_user(user_details.get("user_id"))
 
-        return {"message": "Todo created!"}
+        return {"results": [{"id": todo_id, "status": "created"} for todo_id in ids]}
 
     except InvalidCredentialsException as exc:
         raise exc
@@ -42,6 +168,244 @@ def save_todo(
         )
 
 
+@todo_router.patch("/{user_id}/todos/batch", status_code=status.HTTP_200_OK)
+def update_todos_batch(
+        details: TodoBatchUpdateSchema,
+        user_id: int = Path(gt=0),
+        token: str = Query(),
+        db: Session = Depends(get_db)
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        owner_id = user_details.get("user_id")
+        requested_ids = [todo.id for todo in details.todos]
+        # Lock before reading: the counter delta depends on the current values, which no other writer
+        # may change before this transaction commits
+        revision = lock_todo_stats(db, owner_id)
+        owned = {
+            row.id: row for row in db.execute(
+                select(Todos.id, Todos.complete, Todos.priority).where(
+                    and_(
+                        Todos.owner_id == owner_id,
+                        Todos.id.in_(requested_ids)
+                    )
+                )
+            )
+        }
+
+        # Patches touching the same set of columns share one executemany UPDATE
+        groups = {}
+        stats_delta = Counter()
+        for todo in details.todos:
+            if todo.id in owned:
+                current = owned[todo.id]
+                patch = todo.model_dump(exclude_none=True)
+                stats_delta.update(todo_stats_delta([(
+                    patch.get("complete", current.complete), patch.get("priority", current.priority)
+                )]))
+                stats_delta.subtract(todo_stats_delta([(current.complete, current.priority)]))
+                groups.setdefault(tuple(sorted(patch.keys() - {"id"})), []).append(
+                    {"todo_id": patch.pop("id"), **patch}
+                )
+
+        if owned:
+            add_todo_stats(db, owner_id, stats_delta)
+            table = Todos.__table__
+            for columns, params in groups.items():
+                db.execute(
+                    update(table).where(
+                        and_(
+                            table.c.id == bindparam("todo_id"),
+                            table.c.owner_id == owner_id
+                        )
+                    ).values({**{column: bindparam(column) for column in columns}, "revision": revision}),
+                    params
+                )
+            db.commit()
+            todo_cache.invalidate_user(owner_id)
+        else:
+            db.rollback()
+
+        return {"results": [
+            {"id": todo_id, "status": "updated" if todo_id in owned else "not_found"}
+            for todo_id in requested_ids
+        ]}
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error occurred while updating details"
+        )
+
+
+@todo_router.delete("/{user_id}/todos/batch", status_code=status.HTTP_200_OK)
+def delete_todos_batch(
+        details: TodoBatchDeleteSchema,
+        user_id: int = Path(gt=0),
+        token: str = Query(),
+        db: Session = Depends(get_db)
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        # Writers lock the stats row before the todos, always in that order, so they cannot deadlock
+        revision = lock_todo_stats(db, user_details.get("user_id"))
+        deleted = db.execute(
+            delete(Todos).where(
+                and_(
+                    Todos.owner_id == user_details.get("user_id"),
+                    Todos.id.in_(details.ids)
+                )
+            ).returning(Todos.id, Todos.complete, Todos.priority)
+        ).all()
+        deleted_ids = {row.id for row in deleted}
+        if deleted:
+            add_todo_stats(
+                db, user_details.get("user_id"), todo_stats_delta(((row.complete, row.priority) for row in deleted), -1)
+            )
+            record_tombstones(db, user_details.get("user_id"), deleted_ids, revision)
+            db.commit()
+            todo_cache.invalidate_user(user_details.get("user_id"))
+        else:
+            db.rollback()
+
+        return {"results": [
+            {"id": todo_id, "status": "deleted" if todo_id in deleted_ids else "not_found"}
+            for todo_id in details.ids
+        ]}
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error occurred while deleting todos"
+        )
+
+
+@todo_router.get("/{user_id}/todos/stats", status_code=status.HTTP_200_OK)
+def get_todos_stats(
+        request: Request,
+        response: Response,
+        token: str,
+        user_id: int = Path(gt=0),
+        db: Session = Depends(get_db)
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        etag = todo_etag(user_details.get("user_id"), get_todo_version(db, user_details.get("user_id")), request)
+        if etag_matches(request, etag):
+            return Response(status_code=NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        response.headers.update({"ETag": etag, "Cache-Control": CACHE_CONTROL})
+        return get_todo_stats(db, user_details.get("user_id"))
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An error occurred while fetching todo stats'
+        )
+
+
+@todo_router.get("/{user_id}/todos/changes", status_code=status.HTTP_200_OK)
+def get_todos_changes(
+        token: str,
+        user_id: int = Path(gt=0),
+        since: Optional[int] = Query(default=None, ge=0, description="revision the client last synced to"),
+        cursor: Optional[str] = Query(default=None, pattern=r"^\d+\.\d+$", description="next_cursor of the previous page"),
+        limit: int = Query(default=100, gt=0, le=500),
+        db: Session = Depends(get_db)
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        # Read before the changes: a write landing in between is returned now and again next sync, never lost
+        revision = get_todo_version(db, user_details.get("user_id"))
+        changes, next_cursor = get_todo_changes(
+            db, user_details.get("user_id"), since, parse_sync_cursor(cursor) if cursor else None, limit
+        )
+        return {"changes": changes, "next_cursor": next_cursor, "revision": revision}
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An error occurred while fetching todo changes'
+        )
+
+
+@todo_router.get("/{user_id}/todos/search", status_code=status.HTTP_200_OK)
+def search_user_todos(
+        token: str,
+        q: str = Query(min_length=1, max_length=200),
+        user_id: int = Path(gt=0),
+        prefix: bool = Query(default=True, description="match words that start with each term"),
+        limit: int = Query(default=20, gt=0, le=100),
+        db: Session = Depends(get_db)
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        return {"todos": search_todos(db, user_details.get("user_id"), q, prefix, limit)}
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An error occurred while searching todos'
+        )
+
+
+@todo_router.get("/{user_id}/todos/export", status_code=status.HTTP_200_OK)
+def export_todos(
+        token: str,
+        user_id: int = Path(gt=0),
+        export_format: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$")
+):
+    try:
+        user_details = validate_user_id_and_token(token, user_id)
+        return StreamingResponse(
+            _export_chunks(user_details.get("user_id"), export_format),
+            media_type=EXPORT_MEDIA_TYPES[export_format],
+            headers={"Content-Disposition": f'attachment; filename="todos.{export_format}"'}
+        )
+
+    except InvalidCredentialsException as exc:
+        raise exc
+
+    except ValidateTokenError as e:
+        raise e
+
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An error occurred while exporting todos'
+        )
+
+
 @todo_router.patch("/{user_id}/todos/{todo_id}", status_code=status.HTTP_202_ACCEPTED)
 def update_todo(
         token: str,
@@ -55,12 +419,15 @@ def update_todo(
 ):
     try:
         user_details = validate_user_id_and_token(token, user_id)
+        # Lock before reading: the counter delta depends on the current values (see lock_todo_stats)
+        revision = lock_todo_stats(db, user_details.get("user_id"))
         result = db.query(Todos).filter(
             and_(
                 Todos.id == todo_id,
                 Todos.owner_id == user_details.get("user_id")
             )
         ).one()
+        stats_delta = todo_stats_delta([(result.complete, result.priority)], -1)
 
         if title:
             result.title = title
@@ -71,7 +438,11 @@ def update_todo(
         if complete:
             result.complete = complete
         db.add(result)
+        stats_delta.update(todo_stats_delta([(result.complete, result.priority)]))
+        add_todo_stats(db, user_details.get("user_id"), stats_delta)
+        result.revision = revision
         db.commit()
+        todo_cache.invalidate_user(user_details.get("user_id"))
 
         return {"message": "Details updated"}
 
@@ -94,8 +465,9 @@ def update_todo(
         )
 
 
-@todo_router.get("{user_id}/todos/{todo_id}", status_code=status.HTTP_200_OK)
+@todo_router.get("/{user_id}/todos/{todo_id}", status_code=status.HTTP_200_OK, response_model=List[TodoResponse])
 def get_particular_todo(
+        request: Request,
         token: str,
         user_id: int = Path(gt=0),
         todo_id: int = Path(gt=0),
@@ -103,13 +475,19 @@ def get_particular_todo(
 ):
     try:
         user_details = validate_user_id_and_token(token, user_id)
-        result = db.query(Todos).filter(
-            and_(
-                Todos.owner_id == user_details.get("user_id"),
-                Todos.id == todo_id
-            )
-        ).all()
-        return result
+        cache_key = todo_cache.key(user_details.get("user_id"), request)
+        cached = todo_cache.get(cache_key)
+        if cached is not None:
+            return cached_todo_response(request, cached)
+
+        # Read the version before the rows: a write landing in between then only costs the
+        # client one extra full response, never a stale 304
+        etag = todo_etag(user_details.get("user_id"), get_todo_version(db, user_details.get("user_id")), request)
+        if etag_matches(request, etag):
+            return Response(status_code=NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        result = db.execute(todo_statement(todo_id, user_details.get("user_id"))).all()
+        return todo_json_response([row._asdict() for row in result], etag, cache_key)
 
     except InvalidCredentialsException as exc:
         raise exc
@@ -124,18 +502,37 @@ def get_particular_todo(
         )
 
 
-@todo_router.get("/{user_id}/todos", status_code=status.HTTP_200_OK)
+@todo_router.get("/{user_id}/todos", status_code=status.HTTP_200_OK, response_model=TodoListResponse)
 def get_all_todos(
+        request: Request,
         token: str,
         user_id: int = Path(gt=0),
+        limit: int = Query(default=50, gt=0, le=500),
+        cursor: Optional[int] = Query(default=None, gt=0, description="id of the last todo of the previous page"),
+        complete: Optional[bool] = Query(default=None),
+        min_priority: Optional[int] = Query(default=None, gt=0, lt=6),
+        max_priority: Optional[int] = Query(default=None, gt=0, lt=6),
+        title_prefix: Optional[str] = Query(default=None, min_length=1, description="case-insensitive title prefix"),
         db: Session = Depends(get_db)
 ):
     try:
         user_details = validate_user_id_and_token(token, user_id)
-        result = db.query(Todos).filter(
-                Todos.owner_id == user_details.get("user_id")
-        ).all()
-        return result
+        cache_key = todo_cache.key(user_details.get("user_id"), request)
+        cached = todo_cache.get(cache_key)
+        if cached is not None:
+            return cached_todo_response(request, cached)
+
+        etag = todo_etag(user_details.get("user_id"), get_todo_version(db, user_details.get("user_id")), request)
+        if etag_matches(request, etag):
+            return Response(status_code=NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        statement = todos_page_statement(
+            user_details.get("user_id"), limit, cursor, complete, min_priority, max_priority, title_prefix
+        )
+        result, next_cursor = split_page(db.execute(statement).all(), limit)
+        return todo_json_response(
+            {"todos": [row._asdict() for row in result], "next_cursor": next_cursor}, etag, cache_key
+        )
 
     except InvalidCredentialsException as exc:
         raise exc
@@ -159,14 +556,20 @@ def delete_particular_todo(
 ):
     try:
         user_details = validate_user_id_and_token(token, user_id)
-        get_todo(db, Todos, todo_id, user_details.get("user_id"))
-        db.query(Todos).filter(
-            and_(
-                Todos.id == todo_id,
-                Todos.owner_id == user_details.get("user_id")
-            )
-        ).delete()
+        # Stats row first, then the todo: the lock order of every write path
+        revision = lock_todo_stats(db, user_details.get("user_id"))
+        todo = db.execute(
+            delete(Todos).where(
+                and_(
+                    Todos.id == todo_id,
+                    Todos.owner_id == user_details.get("user_id")
+                )
+            ).returning(Todos.complete, Todos.priority)
+        ).one()
+        add_todo_stats(db, user_details.get("user_id"), todo_stats_delta([(todo.complete, todo.priority)], -1))
+        record_tombstones(db, user_details.get("user_id"), [todo_id], revision)
         db.commit()
+        todo_cache.invalidate_user(user_details.get("user_id"))
         return {"message": "Todo deleted"}
 
     except InvalidCredentialsException as exc:
@@ -196,23 +599,25 @@ def delete_all_todo(
 ):
     try:
         user_details = validate_user_id_and_token(token, user_id)
-        result = db.query(Todos).filter(
-                Todos.owner_id == user_details.get("user_id")
-            )
-        details = result.all()
-        if len(details) == 0:
+        # Nothing is committed if there turns out to be nothing to delete
+        revision = reset_todo_stats(db, user_details.get("user_id"))
+        tombstone_all_todos(db, user_details.get("user_id"), revision)
+        result = db.execute(
+            delete(Todos).where(Todos.owner_id == user_details.get("user_id"))
+        )
+        if result.rowcount == 0:
             raise NoRecordFound(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No todo tasks found to delete"
             )
-        result.delete()
         db.commit()
+        todo_cache.invalidate_user(user_details.get("user_id"))
         return {"message": "Successfully deleted all tasks"}
 
     except InvalidCredentialsException as exc:
         raise exc
 
-    except NoResultFound as exc:
+    except NoRecordFound as exc:
         raise exc
 
     except ValidateTokenError as e:
@@ -1,21 +1,78 @@
+import json
 from datetime import timedelta
+from typing import Optional
 from fastapi import APIRouter, status, Depends, Query, Path
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.exc import NoResultFound, IntegrityError
 from exceptions import DuplicateException, UnknownErrorException, NoRecordFound, InvalidCredentialsException, \
-    NotAdminError, ValidateTokenError
-from request_body import UsersDetailsSchema, UpdateUserDetails
+    NotAdminError, ValidateTokenError, ServiceUnavailableError
+from hashing import hash_password_async, verify_password_async
+from request_body import UsersDetailsSchema, UpdateUserDetails, UserResponse, UserListResponse
 from sqlalchemy.orm import Session
-from models import Users
-from utils import get_db, bcrypt_context, get_jwt_token, validate_token
+from models import Users, Todos, TodoStats, TodoTombstones
+from response_cache import todo_cache
+from database import SessionLocal
+from sharding import SHARDED, shard_todo_counts
+from utils import get_db, get_jwt_token, validate_token, users_statement, split_page, token_epochs
 
 router = APIRouter(
     prefix="/auth",
     tags=["Users"]
 )
 
+USERS_ROWS_PER_CHUNK = 1000
 
+
+def _user_dicts(rows, with_todo_count):
+    """Rows of users_statement as dicts; with sharding the todo counts come from the users' shards."""
+    if not (with_todo_count and SHARDED):
+        return [row._asdict() for row in rows]
+    counts = shard_todo_counts([row.id for row in rows])
+    return [{**row._asdict(), "todo_count": counts.get(row.id, 0)} for row in rows]
+
+
+def _user_export_chunks(cursor, with_todo_count):
+    # The request's session is closed before the body is streamed, so the dump owns its session
+    db = SessionLocal()
+    try:
+        statement = users_statement(cursor, with_todo_count and not SHARDED)
+        result = db.execute(statement.execution_options(yield_per=USERS_ROWS_PER_CHUNK))
+        for rows in result.partitions():
+            yield "".join(json.dumps(user) + "\n" for user in _user_dicts(rows, with_todo_count))
+    finally:
+        db.close()
+
+
+def _save_user(db, user_obj):
+    db.add(user_obj)
+    db.commit()
+    return user_obj.id
+
+
+def _user_by_name(db, user_name):
+    user = db.execute(
+        select(Users.id, Users.hashed_password, Users.token_epoch).where(Users.user_name == user_name)
+    ).one()
+    # Hand the connection back to the pool while bcrypt runs, so waiting logins do not use up the pool
+    db.rollback()
+    return user
+
+
+def _update_user(db, user_id, values):
+    # One UPDATE of just the given columns, no load of the row first
+    token_epoch = db.execute(
+        update(Users).where(Users.id == user_id).values(**values).returning(Users.token_epoch)
+    ).scalar_one()
+    db.commit()
+    return token_epoch
+
+
+# Routes that hash or verify passwords (sign-up, login, account update) are async and await the password
+# pool, so a burst of logins waits without holding threadpool threads; their database work runs in it
 @router.post("/", status_code=status.HTTP_201_CREATED)
-def create_user_account(
+async def create_user_account(
         user_details: UsersDetailsSchema,
         db: Session = Depends(get_db)
 ):
@@ -23,14 +80,13 @@ def create_user_account(
         user_obj = Users(
             user_name=user_details.user_name,
             email=user_details.email,
-            hashed_password=bcrypt_context.hash(user_details.password)
+            hashed_password=await hash_password_async(user_details.password)
         )
 
-        db.add(user_obj)
-        db.commit()
+        user_id = await run_in_threadpool(_save_user, db, user_obj)
 
         response = {
-            "user_id": user_obj.id,
+            "user_id": user_id,
             "message": "Account created. Please generate token to use other features"
         }
 
@@ -42,6 +98,9 @@ def create_user_account(
             detail="Same user name already exists"
         )
 
+    except ServiceUnavailableError as exc:
+        raise exc
+
     except Exception:
         raise UnknownErrorException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -50,7 +109,7 @@ def create_user_account(
 
 
 @router.patch("/{user_id}", status_code=status.HTTP_201_CREATED)
-def update_user_account(
+async def update_user_account(
         user_id: int,
         user_details: UpdateUserDetails,
         token: str = Query(),
@@ -64,16 +123,23 @@ def update_user_account(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="user_id is incorrect"
             )
-        result = db.query(Users).get(user_id)
+        values = {}
         if user_details.user_name:
-            result.user_name = user_details.user_name
+            values["user_name"] = user_details.user_name
         if user_details.email:
-            result.email = user_details.email
+            values["email"] = user_details.email
         if user_details.password:
-            result.password = user_details.password
-
-        db.add(result)
-        db.commit()
+            # bcrypt runs in the password pool, not on this thread
+            values["hashed_password"] = await hash_password_async(user_details.password)
+        # Tokens carry the user name and were issued against the old password: revoke them
+        revoke_tokens = "user_name" in values or "hashed_password" in values
+        if revoke_tokens:
+            values["token_epoch"] = Users.token_epoch + 1
+            values["token_epoch_changed_at"] = func.now()
+
+        token_epoch = await run_in_threadpool(_update_user, db, user_id, values)
+        if revoke_tokens:
+            token_epochs.bump(user_id, token_epoch)
 
         return {"Successfully updated details"}
 
@@ -83,7 +149,22 @@ def update_user_account(
     except ValidateTokenError as exc:
         raise exc
 
-    except Exception as exc:
+    except NoResultFound:
+        raise NoRecordFound(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No record found"
+        )
+
+    except IntegrityError:
+        raise DuplicateException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Same user name already exists"
+        )
+
+    except ServiceUnavailableError as exc:
+        raise exc
+
+    except Exception:
         raise UnknownErrorException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while updating user's details"
@@ -91,20 +172,20 @@ def update_user_account(
 
 
 @router.get("/token", status_code=status.HTTP_200_OK)
-def get_user_token(
+async def get_user_token(
         user_name: str = Query(),
         password: str = Query(),
         db: Session = Depends(get_db)
 ):
     try:
-        user_details = db.query(Users).filter(Users.user_name == user_name).one()
-        if not bcrypt_context.verify(password, user_details.hashed_password):
+        user_details = await run_in_threadpool(_user_by_name, db, user_name)
+        if not await verify_password_async(password, user_details.hashed_password):
             raise InvalidCredentialsException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials"
             )
 
-        token = get_jwt_token(user_name, user_details.id, timedelta(minutes=20))
+        token = get_jwt_token(user_name, user_details.id, timedelta(minutes=20), user_details.token_epoch)
 
         return {"token": token}
 
@@ -117,6 +198,9 @@ def get_user_token(
     except InvalidCredentialsException as e:
         raise e
 
+    except ServiceUnavailableError as exc:
+        raise exc
+
     except Exception:
         raise UnknownErrorException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -124,9 +208,13 @@ def get_user_token(
         )
 
 
-@router.get("/", status_code=status.HTTP_200_OK)
+@router.get("/", status_code=status.HTTP_200_OK, response_model=UserListResponse)
 def get_all_users(
         token: str = Query(),
+        limit: int = Query(default=100, gt=0, le=1000),
+        cursor: Optional[int] = Query(default=None, ge=0, description="next_cursor of the previous page"),
+        with_todo_count: bool = Query(default=False),
+        stream: bool = Query(default=False, description="stream every user from cursor on as NDJSON"),
         db: Session = Depends(get_db)):
     try:
         user_details = validate_token(token)
@@ -136,12 +224,24 @@ def get_all_users(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Only admin has rights to see the user details"
             )
-        details = db.query(Users).all()
-        return details
+        if stream:
+            return StreamingResponse(
+                _user_export_chunks(cursor, with_todo_count),
+                media_type="application/x-ndjson",
+                headers={"Content-Disposition": 'attachment; filename="users.ndjson"'}
+            )
+
+        # todo_stats lives in the shards, not next to users, so the counts cannot be joined there
+        rows = db.execute(users_statement(cursor, with_todo_count and not SHARDED).limit(limit + 1)).all()
+        users, next_cursor = split_page(rows, limit)
+        return ORJSONResponse({"users": _user_dicts(users, with_todo_count), "next_cursor": next_cursor})
 
     except NotAdminError as exc:
         raise exc
 
+    except ValidateTokenError as exc:
+        raise exc
+
     except Exception:
         raise UnknownErrorException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -163,14 +263,34 @@ def delete_user_account(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="user_id is incorrect"
             )
-        db.query(Users).filter(Users.id == user_id).one()
-        db.query(Users).filter(Users.id == user_id).delete()
+        # The account and everything it owns go in one transaction (one per database with sharding, committed
+        # in turn). Owned rows first: they reference users.id, which PostgreSQL enforces
+        db.execute(delete(TodoTombstones).where(TodoTombstones.owner_id == user_id))
+        db.execute(delete(TodoStats).where(TodoStats.owner_id == user_id))
+        db.execute(delete(Todos).where(Todos.owner_id == user_id))
+        # No row returned means it did not exist; then nothing is committed
+        token_epoch = db.execute(
+            delete(Users).where(Users.id == user_id).returning(Users.token_epoch)
+        ).scalar_one_or_none()
+        if token_epoch is None:
+            db.rollback()
+            raise NoRecordFound(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No record found"
+            )
         db.commit()
+        todo_cache.invalidate_user(user_id)
+        # Refuse the account's remaining tokens in this worker at once (other workers until they expire);
+        # user ids are never reused, so the entry cannot hit a later account
+        token_epochs.bump(user_id, token_epoch + 1)
         return {"User account is deleted."}
 
     except InvalidCredentialsException as exc:
         raise exc
 
+    except ValidateTokenError as exc:
+        raise exc
+
     except NoResultFound:
         raise NoRecordFound(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -187,7 +307,7 @@ def delete_user_account(
         )
 
 
-@router.get("/{user_id}", status_code=status.HTTP_200_OK)
+@router.get("/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse)
 def get_user_details(
         user_id: int = Path(gt=0),
         token: str = Query(),
@@ -200,12 +320,15 @@ def get_user_details(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="user_id is incorrect"
             )
-        details = db.query(Users).filter(Users.id == user_id).one()
-        return details.__dict__
+        details = db.execute(select(Users.id, Users.user_name, Users.email).where(Users.id == user_id)).one()
+        return details._asdict()
 
     except InvalidCredentialsException as exc:
         raise exc
 
+    except ValidateTokenError as exc:
+        raise exc
+
     except NoResultFound:
         raise NoRecordFound(
             status_code=status.HTTP_404_NOT_FOUND,
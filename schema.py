@@ -0,0 +1,44 @@
+"""Startup check that the database is at the Alembic head revision.
+
+The app never creates or alters tables itself; `alembic upgrade head` owns the schema.
+Alembic is imported only when the check runs, so importing the app stays cheap.
+"""
+import os
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class SchemaRevisionError(RuntimeError):
+    pass
+
+
+def alembic_config():
+    from alembic.config import Config
+
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    return config
+
+
+def head_revisions():
+    from alembic.script import ScriptDirectory
+
+    return set(ScriptDirectory.from_config(alembic_config()).get_heads())
+
+
+def current_revisions(engine):
+    from alembic.runtime.migration import MigrationContext
+
+    with engine.connect() as connection:
+        return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def check_schema_revision(engine):
+    """Raise SchemaRevisionError unless the database is stamped with the migration head(s)."""
+    current, expected = current_revisions(engine), head_revisions()
+    if current != expected:
+        raise SchemaRevisionError(
+            f"Database schema is at revision {sorted(current) or 'none'}, expected {sorted(expected)}; "
+            "run `alembic upgrade head`"
+        )
+    return current
@@ -0,0 +1,148 @@
+"""Per-user sharding of the todo data across several databases (TODOS_SHARD_URLS).
+
+Users (sign-up, login, the admin listing) stay in TODOS_DATABASE_URL. Everything keyed by
+owner_id (todos, todo_stats, todo_tombstones and the search index) lives in shard
+owner_id % len(TODOS_SHARD_URLS). Each shard has its own engine and pool, so writes of users
+on different SQLite shards never wait for the same write lock. Every database carries the
+full schema and `alembic upgrade head` migrates all of them.
+
+Changing the shard list changes where users belong: stop the app and run
+`python manage.py rebalance`, which moves their rows (see rebalance()).
+"""
+from collections import defaultdict
+from sqlalchemy import delete, insert, select, union
+from sqlalchemy.orm import Session
+from config import SHARD_URLS, USE_ASYNC_DB
+from database import AsyncSessionLocal, SessionLocal, async_engine, create_app_async_engine, create_app_engine, engine
+from models import Todos, TodoStats, TodoTombstones, Users
+from todo_stats import apply_todo_stats_delta
+from todo_sync import record_tombstones
+
+SHARDED = bool(SHARD_URLS)
+shard_engines = [create_app_engine(url) for url in SHARD_URLS]
+async_shard_engines = [create_app_async_engine(url) for url in SHARD_URLS] if USE_ASYNC_DB else []
+# Databases holding todo data: the shards, or just the main database when sharding is off
+shard_count = len(shard_engines) or 1
+
+OWNER_TABLES = (Todos, TodoStats, TodoTombstones)
+# Ids per IN (...) list, well under SQLite's limit on bound parameters
+IN_CHUNK_SIZE = 500
+
+
+def shard_index(owner_id):
+    return owner_id % shard_count
+
+
+def shard_engine(index):
+    return shard_engines[index] if SHARDED else engine
+
+
+def all_engines():
+    """The main database followed by every shard."""
+    return [engine, *shard_engines]
+
+
+def shard_session(index):
+    """Session on one shard; queries on Users still go to the main database."""
+    if not SHARDED:
+        return SessionLocal()
+    return SessionLocal(bind=shard_engines[index], binds={Users: engine})
+
+
+def user_session(user_id=None):
+    """Session for work on one user's data: their shard, plus the main database for Users."""
+    return SessionLocal() if user_id is None else shard_session(shard_index(user_id))
+
+
+def async_user_session(user_id=None):
+    if not SHARDED or user_id is None:
+        return AsyncSessionLocal()
+    return AsyncSessionLocal(bind=async_shard_engines[shard_index(user_id)], binds={Users: async_engine})
+
+
+def shard_todo_counts(owner_ids):
+    """{owner_id: todo total} from the todo_stats of each owner's shard, one query per shard involved."""
+    owners_by_shard = defaultdict(list)
+    for owner_id in owner_ids:
+        owners_by_shard[shard_index(owner_id)].append(owner_id)
+    counts = {}
+    for index, shard_owner_ids in owners_by_shard.items():
+        with shard_session(index) as db:
+            counts.update(db.execute(
+                select(TodoStats.owner_id, TodoStats.total).where(TodoStats.owner_id.in_(shard_owner_ids))
+            ).all())
+    return counts
+
+
+def _owner_ids(db):
+    return set(db.scalars(union(*(select(table.owner_id) for table in OWNER_TABLES))))
+
+
+def _move_owner(source, target, owner_id):
+    """Copy one owner's rows from source to target, then delete them from source.
+
+    Todo ids are only unique within one database, so ids the target already uses get new
+    ones. The old ids get tombstones at a new revision, so delta-sync clients drop them and
+    fetch the renumbered rows. Returns the number of renumbered todos.
+    """
+    with Session(source) as source_db, Session(target) as target_db:
+        rows = {
+            table: [dict(row) for row in source_db.execute(
+                select(table.__table__).where(table.owner_id == owner_id)
+            ).mappings()]
+            for table in OWNER_TABLES
+        }
+        # Rows left in the target by an interrupted earlier run; the source still holds all of them
+        for table in OWNER_TABLES:
+            target_db.execute(delete(table).where(table.owner_id == owner_id))
+
+        todo_ids = [row["id"] for row in rows[Todos]]
+        taken = set()
+        for start in range(0, len(todo_ids), IN_CHUNK_SIZE):
+            taken.update(target_db.scalars(
+                select(Todos.id).where(Todos.id.in_(todo_ids[start:start + IN_CHUNK_SIZE]))
+            ))
+
+        kept = [row for row in rows[Todos] if row["id"] not in taken]
+        if kept:
+            target_db.execute(insert(Todos), kept)
+        for table in (TodoStats, TodoTombstones):
+            if rows[table]:
+                target_db.execute(insert(table), rows[table])
+        if taken:
+            revision = apply_todo_stats_delta(target_db, owner_id, {})
+            record_tombstones(target_db, owner_id, sorted(taken), revision)
+            target_db.execute(insert(Todos), [
+                {**{column: value for column, value in row.items() if column != "id"}, "revision": revision}
+                for row in rows[Todos] if row["id"] in taken
+            ])
+        target_db.commit()
+
+        for table in OWNER_TABLES:
+            source_db.execute(delete(table).where(table.owner_id == owner_id))
+        source_db.commit()
+    return len(taken)
+
+
+def rebalance(extra_urls=(), dry_run=False):
+    """Move every owner's rows to the database shard_index() maps them to.
+
+    Owners are looked for in the main database, every shard and extra_urls (e.g. shards
+    dropped from TODOS_SHARD_URLS), so this also moves data into shards when sharding is
+    turned on, and back when it is turned off. Run it with the app stopped: a request for an
+    owner being moved could see part of their rows. Returns (owners moved, todos renumbered).
+    """
+    sources = [*all_engines(), *(create_app_engine(url) for url in extra_urls)]
+    moved = renumbered = 0
+    for source in sources:
+        with Session(source) as db:
+            owner_ids = sorted(_owner_ids(db))
+        for owner_id in owner_ids:
+            target = shard_engine(shard_index(owner_id))
+            # Compare URLs, not engines: extra_urls may name a database that is already configured
+            if target.url == source.url:
+                continue
+            moved += 1
+            if not dry_run:
+                renumbered += _move_owner(source, target, owner_id)
+    return moved, renumbered
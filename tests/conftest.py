@@ -0,0 +1,136 @@
+"""Shared test fixtures.
+
+Settings are read from the environment when the app modules are imported, so the app is
+pointed at a scratch database here, before any test module imports it; the shipped todos.db
+is never touched. Test databases are created with `alembic upgrade head`, as in a deployment.
+
+Tests taking `db` run once per backend: SQLite always, PostgreSQL when TODOS_TEST_POSTGRES_URL
+names a database the tests may fill and empty (they are skipped otherwise).
+"""
+import atexit
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="todos-tests-")
+atexit.register(shutil.rmtree, SCRATCH_DIR, ignore_errors=True)
+os.environ["TODOS_DATABASE_URL"] = f"sqlite:///{SCRATCH_DIR}/todos.db"
+os.environ.pop("TODOS_SHARD_URLS", None)
+os.environ["TODOS_RATE_LIMIT_BACKEND"] = "none"
+os.environ["TODOS_CACHE_BACKEND"] = "none"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+
+def migrate(url):
+    """Bring the database at url to the Alembic head (alembic/env.py reads TODOS_DATABASE_URL)."""
+    completed = subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=ROOT, env={**os.environ, "TODOS_DATABASE_URL": url}, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"alembic upgrade head failed for {url}:\n{completed.stderr}")
+
+
+@pytest.fixture(scope="session")
+def sqlite_url(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('sqlite') / 'todos.db'}"
+    migrate(url)
+    return url
+
+
+@pytest.fixture(scope="session", params=["sqlite", "postgresql"])
+def backend_url(request, sqlite_url):
+    if request.param == "sqlite":
+        return sqlite_url
+    url = os.getenv("TODOS_TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TODOS_TEST_POSTGRES_URL is not set")
+    migrate(url)
+    return url
+
+
+@pytest.fixture(scope="session")
+def backend_engine(backend_url):
+    from sqlalchemy import create_engine, event
+
+    engine = create_engine(backend_url)
+    if engine.dialect.name == "sqlite":
+        # SQLite ignores foreign keys unless asked; enforce them like PostgreSQL does
+        event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(backend_engine):
+    from sqlalchemy import delete
+    from sqlalchemy.orm import Session
+    from models import Todos, TodoStats, TodoTombstones, Users
+
+    session = Session(backend_engine)
+    yield session
+    session.rollback()
+    for table in (TodoTombstones, TodoStats, Todos, Users):
+        session.execute(delete(table))
+    session.commit()
+    session.close()
+
+
+@pytest.fixture
+def owner_id(db):
+    from sqlalchemy import insert
+    from models import Users
+
+    user_id = db.scalar(
+        insert(Users).values(user_name="owner", email="owner@example.com", hashed_password="x").returning(Users.id)
+    )
+    db.commit()
+    return user_id
+
+
+@pytest.fixture
+def client(db, backend_engine):
+    """TestClient for the app on the test backend; each request gets its own session, as with get_db."""
+    from fastapi.testclient import TestClient
+    from sqlalchemy.orm import Session
+    from main import app
+    from utils import get_db, token_epochs
+
+    def get_test_db():
+        with Session(backend_engine) as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_test_db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    # Epochs bumped here must not revoke tokens of users with the same id on the other backend
+    token_epochs._epochs.clear()
+
+
+@pytest.fixture
+def token(owner_id):
+    from datetime import timedelta
+    from utils import get_jwt_token
+
+    return get_jwt_token("owner", owner_id, timedelta(minutes=5))
+
+
+def run_concurrently(requests):
+    """Send (method, url, kwargs) requests to the app all at once; sync routes then run on parallel threads."""
+    import asyncio
+    import httpx
+    from main import app
+
+    async def send_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.request(method, url, **kwargs) for method, url, kwargs in requests))
+
+    return asyncio.run(send_all())
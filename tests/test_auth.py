@@ -0,0 +1,83 @@
+import asyncio
+
+import anyio.to_thread
+import httpx
+from passlib.context import CryptContext
+from sqlalchemy import insert
+
+from hashing import password_pool_stats
+from main import app
+from models import Users
+from utils import TokenEpochs
+
+
+def sign_up(client, user_name="alice", password="secret"):
+    return client.post(
+        "/auth/", json={"user_name": user_name, "email": f"{user_name}@example.com", "password": password}
+    )
+
+
+def test_sign_up_and_login(client):
+    response = sign_up(client)
+    assert response.status_code == 201, response.text
+    user_id = response.json()["user_id"]
+
+    response = client.get("/auth/token", params={"user_name": "alice", "password": "secret"})
+    assert response.status_code == 200
+    assert client.get(f"/{user_id}/todos", params={"token": response.json()["token"]}).status_code == 200
+
+
+def test_login_errors(client):
+    sign_up(client)
+    assert client.get("/auth/token", params={"user_name": "alice", "password": "wrong"}).status_code == 401
+    assert client.get("/auth/token", params={"user_name": "nobody", "password": "secret"}).status_code == 404
+    assert sign_up(client).status_code == 406
+
+
+def test_login_burst_holds_no_threadpool_threads(client, db):
+    # Slow enough hashes that the logins queue up in the password pool
+    hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=10).hash("secret")
+    db.execute(insert(Users).values(user_name="burst", email="burst@example.com", hashed_password=hashed_password))
+    db.commit()
+    logins = 20
+
+    async def burst():
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        samples = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            requests = asyncio.gather(*(
+                async_client.get("/auth/token", params={"user_name": "burst", "password": "secret"})
+                for _ in range(logins)
+            ))
+            task = asyncio.ensure_future(requests)
+            while not task.done():
+                samples.append((password_pool_stats()["in_flight"], limiter.borrowed_tokens))
+                await asyncio.sleep(0.005)
+            return await task, samples
+
+    responses, samples = asyncio.run(burst())
+    assert [response.status_code for response in responses] == [200] * logins
+    # Once every login is queued in the pool, waiting holds no threads (a sync route would hold one per login)
+    peak = max(range(len(samples)), key=lambda index: samples[index][0])
+    assert samples[peak][0] > logins // 2
+    assert max(threads for _, threads in samples[peak:]) <= 2
+
+
+def test_password_change_revokes_earlier_tokens(client, backend_engine):
+    user_id = sign_up(client).json()["user_id"]
+    old_token = client.get("/auth/token", params={"user_name": "alice", "password": "secret"}).json()["token"]
+    other_worker = TokenEpochs(backend_engine)
+    other_worker.refresh()
+
+    response = client.patch(f"/auth/{user_id}", params={"token": old_token}, json={"password": "changed"})
+    assert response.status_code == 201, response.text
+
+    # Another worker learns about the change on its next refresh
+    assert other_worker.get(user_id) == 0
+    other_worker.refresh()
+    assert other_worker.get(user_id) == 1
+    assert client.get(f"/{user_id}/todos", params={"token": old_token}).status_code == 401
+    assert client.get("/auth/token", params={"user_name": "alice", "password": "secret"}).status_code == 401
+    new_token = client.get("/auth/token", params={"user_name": "alice", "password": "changed"}).json()["token"]
+    assert client.get(f"/{user_id}/todos", params={"token": new_token}).status_code == 200
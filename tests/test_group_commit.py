@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import group_commit
+from exceptions import ServiceUnavailableError
+from group_commit import GroupCommitWriter, stop_writers
+from models import Todos
+from todo_stats import get_todo_stats
+
+MISSING_OWNER_ID = 10 ** 6
+
+
+def todo_values(title):
+    return {"title": title, "description": "", "priority": 1, "complete": False}
+
+
+def submit_all(writer, rows):
+    """Submit (owner_id, title) rows from one thread each; return each row's id or the exception it raised."""
+    def submit(row):
+        try:
+            return writer.submit(row[0], todo_values(row[1]))
+        except Exception as exc:
+            return exc
+
+    with ThreadPoolExecutor(len(rows)) as pool:
+        return list(pool.map(submit, rows))
+
+
+def titles(db, owner_id):
+    return db.scalars(select(Todos.title).where(Todos.owner_id == owner_id).order_by(Todos.id)).all()
+
+
+@pytest.fixture
+def writer(backend_engine):
+    # Groups are only cut by size here, so tests decide exactly which rows share one
+    writer = GroupCommitWriter(partial(Session, backend_engine), max_delay_ms=5000, max_rows=4, name="test-writer")
+    yield writer
+    writer.stop()
+
+
+def test_concurrent_rows_are_committed_as_one_group(writer, db, owner_id):
+    ids = submit_all(writer, [(owner_id, f"todo {n}") for n in range(4)])
+
+    assert sorted(titles(db, owner_id)) == [f"todo {n}" for n in range(4)]
+    assert sorted(ids) == db.scalars(select(Todos.id).where(Todos.owner_id == owner_id).order_by(Todos.id)).all()
+    assert get_todo_stats(db, owner_id)["total"] == 4
+    assert writer.stats() == {
+        "groups": 1, "rows": 4, "largest_group": 4, "retried_groups": 0, "failed_rows": 0, "timed_out": 0, "queued": 0
+    }
+
+
+def test_failed_group_is_retried_one_by_one(writer, db, owner_id):
+    # A row of an owner that does not exist breaks the group's transaction on a foreign key
+    results = submit_all(writer, [(owner_id, "first"), (MISSING_OWNER_ID, "orphan"), (owner_id, "second"),
+                                  (owner_id, "third")])
+
+    assert [isinstance(result, IntegrityError) for result in results] == [False, True, False, False]
+    assert sorted(titles(db, owner_id)) == ["first", "second", "third"]
+    assert titles(db, MISSING_OWNER_ID) == []
+    assert get_todo_stats(db, owner_id)["total"] == 3
+    stats = writer.stats()
+    assert (stats["groups"], stats["rows"], stats["retried_groups"], stats["failed_rows"]) == (1, 3, 1, 1)
+
+
+def test_stop_writers_commits_queued_rows(writer, db, owner_id, monkeypatch):
+    monkeypatch.setattr(group_commit, "todo_writers", [writer])
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(writer.submit, owner_id, todo_values(title)) for title in ("first", "second")]
+        # Both rows are queued ahead of the stop; with fewer rows than max_rows and a long delay,
+        # only stopping ends their group early
+        while writer._queue.unfinished_tasks < 2:
+            time.sleep(0.001)
+        stop_writers()
+        ids = [future.result(timeout=5) for future in futures]
+
+    assert len(set(ids)) == 2
+    assert sorted(titles(db, owner_id)) == ["first", "second"]
+    assert writer._thread is None
+
+
+def test_stuck_writer_answers_503_and_drops_rows_it_did_not_take(backend_engine, db, owner_id):
+    entered, release = threading.Event(), threading.Event()
+
+    def stuck_session():
+        entered.set()
+        release.wait()
+        return Session(backend_engine)
+
+    writer = GroupCommitWriter(stuck_session, max_delay_ms=0, max_rows=1, timeout=0.2)
+    try:
+        with ThreadPoolExecutor(1) as pool:
+            taken = pool.submit(writer.submit, owner_id, todo_values("taken"))
+            assert entered.wait(5)
+            with pytest.raises(ServiceUnavailableError) as raised:
+                writer.submit(owner_id, todo_values("dropped"))
+            assert raised.value.status_code == 503
+            assert raised.value.headers["Retry-After"] == "1"
+            # The writer already took this row when its caller gave up, so it is still committed
+            with pytest.raises(ServiceUnavailableError):
+                taken.result()
+    finally:
+        release.set()
+        writer.stop()
+
+    assert titles(db, owner_id) == ["taken"]
+    assert writer.stats()["timed_out"] == 2
+
+
+def test_save_todo_passes_503_through(client, owner_id, token, monkeypatch):
+    import router.todos
+
+    def busy(owner_id, values):
+        raise ServiceUnavailableError(status_code=503, detail="Server is busy, please retry shortly",
+                                      headers={"Retry-After": "1"})
+
+    monkeypatch.setattr(router.todos, "GROUP_COMMIT", True)
+    monkeypatch.setattr(router.todos, "submit_todo", busy)
+    response = client.post(f"/{owner_id}/todos", params={"token": token}, json={
+        "title": "queued", "description": "while the writer is stuck", "priority": 1
+    })
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,68 @@
+import re
+
+import pytest
+from sqlalchemy import event
+
+import metrics
+from metrics import MetricsRegistry
+
+STATS_ROUTE = "/{user_id}/todos/stats"
+
+
+@pytest.fixture
+def registry(backend_engine):
+    """The app's registry, emptied, with the test engine's cursor time counted towards the "db" phase."""
+    listeners = [
+        ("before_cursor_execute", metrics._before_cursor_execute),
+        ("after_cursor_execute", metrics._after_cursor_execute),
+        ("handle_error", metrics._handle_error),
+    ]
+    for name, listener in listeners:
+        event.listen(backend_engine, name, listener)
+    metrics.registry.clear()
+    yield metrics.registry
+    for name, listener in listeners:
+        event.remove(backend_engine, name, listener)
+    metrics.registry.clear()
+
+
+def phase_counts(exposition, route):
+    pattern = rf'^todos_request_phase_seconds_count{{method="(\w+)",route="{re.escape(route)}",phase="(\w+)"}} (\d+)$'
+    return {(method, phase): int(count) for method, phase, count in re.findall(pattern, exposition, re.MULTILINE)}
+
+
+def test_only_entered_phases_are_observed(registry, client, owner_id, token):
+    for _ in range(3):
+        assert client.get(f"/{owner_id}/todos/stats", params={"token": token}).status_code == 200
+    response = client.post("/auth/", json={
+        "user_name": "metered", "email": "metered@example.com", "password": "password123"
+    })
+    assert response.status_code == 201
+
+    exposition = client.get("/metrics").text
+    # The stats route never hashes a password or waits for the group-commit writer
+    assert phase_counts(exposition, STATS_ROUTE) == {("GET", "jwt"): 3, ("GET", "db"): 3}
+    assert phase_counts(exposition, "/auth/")[("POST", "bcrypt")] == 1
+    # /metrics itself enters no phase, so it only has latency series
+    assert phase_counts(exposition, "/metrics") == {}
+    assert 'todos_http_requests_total{method="GET",route="/{user_id}/todos/stats",status="200"} 3' in exposition
+
+
+def test_render_writes_cumulative_buckets():
+    registry = MetricsRegistry()
+    registry.request_started()
+    registry.request_finished("GET", "/a", 200, 0.003, {"db": 0.002})
+    registry.request_started()
+    registry.request_finished("GET", "/a", 404, 0.02, {})
+
+    lines = registry.render({"todos_cache": {"hits": 2, "enabled": True, "backend": "lru"}}).splitlines()
+    assert "todos_http_requests_in_flight 0" in lines
+    assert 'todos_http_request_duration_seconds_bucket{method="GET",route="/a",le="0.0025"} 0' in lines
+    assert 'todos_http_request_duration_seconds_bucket{method="GET",route="/a",le="0.005"} 1' in lines
+    assert 'todos_http_request_duration_seconds_bucket{method="GET",route="/a",le="+Inf"} 2' in lines
+    assert 'todos_http_request_duration_seconds_count{method="GET",route="/a"} 2' in lines
+    assert 'todos_request_phase_seconds_count{method="GET",route="/a",phase="db"} 1' in lines
+    assert not [line for line in lines if 'phase="' in line and 'phase="db"' not in line]
+    # Only numeric stats become gauges
+    assert "todos_cache_hits 2" in lines
+    assert not [line for line in lines if line.startswith(("todos_cache_enabled", "todos_cache_backend"))]
@@ -0,0 +1,36 @@
+import sqlite3
+
+from sqlalchemy import create_engine, inspect
+
+from conftest import migrate
+
+# Schema the app created with Base.metadata.create_all before the schema moved to Alembic
+PRE_ALEMBIC_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL, user_name VARCHAR, email VARCHAR, hashed_password VARCHAR,
+    PRIMARY KEY (id), UNIQUE (user_name)
+);
+CREATE INDEX ix_users_id ON users (id);
+CREATE TABLE todos (
+    id INTEGER NOT NULL, title VARCHAR, description VARCHAR, priority INTEGER, complete BOOLEAN, owner_id INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(owner_id) REFERENCES users (id)
+);
+CREATE INDEX ix_todos_id ON todos (id);
+INSERT INTO users (user_name, email, hashed_password) VALUES ('early', 'early@example.com', 'x');
+INSERT INTO todos (title, description, priority, complete, owner_id) VALUES ('kept', '', 3, 0, 1);
+"""
+
+
+def test_upgrade_adopts_database_created_before_alembic(tmp_path):
+    path = tmp_path / "todos.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript(PRE_ALEMBIC_SCHEMA)
+
+    migrate(f"sqlite:///{path}")
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT version_num FROM alembic_version").scalar_one()
+        assert connection.exec_driver_sql("SELECT title, revision FROM todos").all() == [("kept", 0)]
+    assert {"todo_stats", "todo_tombstones"} <= set(inspect(engine).get_table_names())
+    engine.dispose()
@@ -0,0 +1,43 @@
+"""The owner-scoped todo reads must be index searches, never a scan of every user's todos."""
+import pytest
+from sqlalchemy import create_engine
+
+from utils import todo_statement, todos_page_statement
+
+
+@pytest.fixture(scope="module")
+def plan(sqlite_url):
+    engine = create_engine(sqlite_url)
+
+    def explain(statement):
+        sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+        with engine.connect() as connection:
+            return [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+    yield explain
+    engine.dispose()
+
+
+def test_list_uses_owner_id_index(plan):
+    assert plan(todos_page_statement(1, 50)) == ["SEARCH todos USING INDEX ix_todos_owner_id_id (owner_id=?)"]
+
+
+def test_list_page_after_cursor_uses_owner_id_index(plan):
+    assert plan(todos_page_statement(1, 50, cursor=100)) == [
+        "SEARCH todos USING INDEX ix_todos_owner_id_id (owner_id=? AND id>?)"
+    ]
+
+
+def test_detail_is_a_primary_key_lookup(plan):
+    # (owner_id, id) would also do, but the rowid lookup is cheaper still; what matters is no SCAN
+    steps = plan(todo_statement(5, 1))
+    assert steps == ["SEARCH todos USING INTEGER PRIMARY KEY (rowid=?)"]
+
+
+def test_filter_uses_owner_complete_priority_index(plan):
+    steps = plan(todos_page_statement(1, 50, complete=True, min_priority=2, max_priority=4))
+    assert steps[0] == (
+        "SEARCH todos USING INDEX ix_todos_owner_id_complete_priority "
+        "(owner_id=? AND complete=? AND priority>? AND priority<?)"
+    )
+    assert not any(step.startswith("SCAN") for step in steps)
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from rate_limit import RATE_LIMITS, NullRateLimitBackend, RateLimiter
+
+
+def rule_name(limiter, method, path):
+    rule = limiter.match(method, path)
+    return rule[0] if rule else None
+
+
+def test_route_rules_win_over_catch_all():
+    limiter = RateLimiter(NullRateLimitBackend(), RATE_LIMITS)
+    assert rule_name(limiter, "GET", "/auth/token") == "GET /auth/token"
+    assert rule_name(limiter, "GET", "/7/todos") == "GET /{user_id}/todos"
+    assert rule_name(limiter, "GET", "/7/todos/search") == "GET /{user_id}/todos/search"
+    assert rule_name(limiter, "POST", "/7/todos") == "*"
+
+
+def test_override_for_unlisted_route_is_matched_before_catch_all():
+    # What TODOS_RATE_LIMITS does: new rules end up after "*" in the dict
+    limits = {**RATE_LIMITS, "GET /{user_id}/todos/stats": ("user", 1, 60)}
+    limiter = RateLimiter(NullRateLimitBackend(), limits)
+    assert rule_name(limiter, "GET", "/7/todos/stats") == "GET /{user_id}/todos/stats"
+    assert rule_name(limiter, "GET", "/7/todos/changes") == "*"
+
+
+def import_rate_limit(**env):
+    """Import rate_limit in a fresh interpreter with env applied; returns the completed process."""
+    child_env = {name: value for name, value in os.environ.items() if not name.startswith("TODOS_RATE_LIMIT")}
+    return subprocess.run(
+        [sys.executable, "-c", "import rate_limit; print(rate_limit.RATE_LIMIT_BACKEND, rate_limit.RATE_LIMITS)"],
+        cwd=ROOT, env={**child_env, **env}, capture_output=True, text=True
+    )
+
+
+def test_limiter_is_off_by_default():
+    completed = import_rate_limit()
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.split()[0] == "none"
+
+
+def test_overrides_are_read_from_the_environment():
+    completed = import_rate_limit(TODOS_RATE_LIMITS='{"GET /auth/token": ["ip", 20, 60]}')
+    assert completed.returncode == 0, completed.stderr
+    assert "'GET /auth/token': ('ip', 20, 60)" in completed.stdout
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ('{"GET /auth/token": ["ip", 20, 60]', "TODOS_RATE_LIMITS is not valid JSON"),
+    ('[["ip", 20, 60]]', "TODOS_RATE_LIMITS must be a JSON object"),
+    ('{"GET /auth/token": ["client", 20, 60]}', "TODOS_RATE_LIMITS rule 'GET /auth/token' must be"),
+    ('{"GET /auth/token": ["ip", 0, 60]}', "TODOS_RATE_LIMITS rule 'GET /auth/token' must be"),
+])
+def test_malformed_overrides_fail_at_startup(overrides, message):
+    completed = import_rate_limit(TODOS_RATE_LIMITS=overrides)
+    assert completed.returncode != 0
+    assert message in completed.stderr
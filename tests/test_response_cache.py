@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from starlette.requests import Request
+
+from conftest import ROOT
+from response_cache import LRUCacheBackend, LocalSharedCacheBackend, NullCacheBackend, todo_cache
+from test_todo_stats import add_todo
+
+
+def test_cache_is_off_by_default():
+    env = {name: value for name, value in os.environ.items() if name != "TODOS_CACHE_BACKEND"}
+    output = subprocess.run(
+        [sys.executable, "-c", "from response_cache import todo_cache; print(type(todo_cache.backend).__name__)"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == NullCacheBackend.__name__
+
+
+@pytest.fixture(params=[LRUCacheBackend, LocalSharedCacheBackend])
+def cache(request, monkeypatch):
+    monkeypatch.setattr(todo_cache, "backend", request.param(100))
+    monkeypatch.setattr(todo_cache, "hits", 0)
+    monkeypatch.setattr(todo_cache, "misses", 0)
+    return todo_cache
+
+
+def test_repeated_reads_are_hits(cache, client, db, owner_id, token):
+    add_todo(db, owner_id, title="cached")
+    first = client.get(f"/{owner_id}/todos", params={"token": token})
+    second = client.get(f"/{owner_id}/todos", params={"token": token})
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # The cached ETag still answers If-None-Match with 304
+    headers = {"If-None-Match": first.headers["ETag"]}
+    assert client.get(f"/{owner_id}/todos", params={"token": token}, headers=headers).status_code == 304
+
+
+def test_write_invalidates_the_users_entries(cache, client, db, owner_id, token):
+    add_todo(db, owner_id, title="first")
+    client.get(f"/{owner_id}/todos", params={"token": token})
+
+    response = client.post(f"/{owner_id}/todos", params={"token": token}, json={
+        "title": "second", "description": "after the read", "priority": 2
+    })
+    assert response.status_code == 201
+    titles = [todo["title"] for todo in client.get(f"/{owner_id}/todos", params={"token": token}).json()["todos"]]
+    assert titles == ["first", "second"]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_generation_only_moves_for_the_written_user(cache):
+    request = Request({"type": "http", "path": "/1/todos", "query_string": b"token=t&limit=5", "headers": []})
+    first, other = cache.key(1, request), cache.key(2, request)
+    cache.invalidate_user(1)
+    assert cache.key(1, request) != first
+    assert cache.key(2, request) == other
+
+
+def test_lru_backend_evicts_and_expires(monkeypatch):
+    backend = LRUCacheBackend(2)
+    backend.set("a", 1, 30)
+    backend.set("b", 2, 30)
+    backend.get("a")
+    backend.set("c", 3, 30)
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (1, None, 3)
+    assert backend.evictions == 1
+
+    backend.set("short", 4, 0.01)
+    monkeypatch.setattr("response_cache.time.monotonic", lambda: float("inf"))
+    assert backend.get("short") is None
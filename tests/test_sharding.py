@@ -0,0 +1,156 @@
+import shutil
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+import router.user
+import sharding
+from conftest import migrate
+from database import create_app_engine
+from main import app
+from models import Todos, TodoStats, TodoTombstones, Users
+from sharding import rebalance, shard_todo_counts
+from test_todo_stats import add_todo
+from todo_stats import get_todo_stats, get_todo_version
+from utils import get_jwt_token, token_epochs
+
+
+@pytest.fixture(scope="module")
+def migrated_db(tmp_path_factory):
+    """A migrated SQLite file, copied for each database of a test instead of migrating every one."""
+    path = tmp_path_factory.mktemp("sharding") / "template.db"
+    migrate(f"sqlite:///{path}")
+    return path
+
+
+@pytest.fixture
+def engines(migrated_db, tmp_path, monkeypatch):
+    """A scratch main database and two scratch shards, swapped in for the configured databases."""
+    created = []
+    for name in ("main", "shard0", "shard1"):
+        shutil.copy(migrated_db, tmp_path / f"{name}.db")
+        created.append(create_app_engine(f"sqlite:///{tmp_path / name}.db"))
+    main, *shards = created
+    monkeypatch.setattr(sharding, "SHARDED", True)
+    monkeypatch.setattr(sharding, "shard_engines", shards)
+    monkeypatch.setattr(sharding, "shard_count", len(shards))
+    monkeypatch.setattr(sharding, "engine", main)
+    monkeypatch.setattr(sharding, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=main))
+    monkeypatch.setattr(router.user, "SHARDED", True)
+    yield main, shards
+    token_epochs._epochs.clear()
+    for engine in created:
+        engine.dispose()
+
+
+@pytest.fixture
+def sharded_client(engines):
+    # No get_db override: requests get their sessions from sharding.user_session
+    return TestClient(app)
+
+
+def add_user(engine, user_name):
+    with Session(engine) as db:
+        user_id = db.scalar(insert(Users).values(
+            user_name=user_name, email=f"{user_name}@example.com", hashed_password="x"
+        ).returning(Users.id))
+        db.commit()
+    return user_id
+
+
+def owner_titles(engine, owner_id):
+    with Session(engine) as db:
+        return db.scalars(select(Todos.title).where(Todos.owner_id == owner_id).order_by(Todos.id)).all()
+
+
+def token_for(user_id, user_name="owner"):
+    return get_jwt_token(user_name, user_id, timedelta(minutes=5))
+
+
+def test_todos_are_routed_to_the_owners_shard(engines, sharded_client):
+    main, shards = engines
+    odd, even = add_user(main, "odd"), add_user(main, "even")
+    assert (odd % 2, even % 2) == (1, 0)
+
+    for user_id in (odd, even):
+        response = sharded_client.post(f"/{user_id}/todos", params={"token": token_for(user_id)}, json={
+            "title": f"todo of {user_id}", "description": "on its shard", "priority": 1
+        })
+        assert response.status_code == 201
+
+    assert owner_titles(shards[1], odd) == [f"todo of {odd}"]
+    assert owner_titles(shards[0], even) == [f"todo of {even}"]
+    assert owner_titles(shards[0], odd) == owner_titles(shards[1], even) == []
+    assert owner_titles(main, odd) == owner_titles(main, even) == []
+    listed = sharded_client.get(f"/{odd}/todos", params={"token": token_for(odd)}).json()["todos"]
+    assert [todo["title"] for todo in listed] == [f"todo of {odd}"]
+
+
+def test_todo_counts_are_read_from_each_shard(engines, sharded_client):
+    main, shards = engines
+    user_ids = [add_user(main, name) for name in ("first", "second", "third")]
+    for count, user_id in enumerate(user_ids, start=1):
+        with Session(shards[user_id % 2]) as db:
+            for _ in range(count):
+                add_todo(db, user_id)
+
+    assert shard_todo_counts(user_ids) == dict(zip(user_ids, [1, 2, 3]))
+    response = sharded_client.get("/auth/", params={"token": token_for(1, "amit_sahni"), "with_todo_count": True})
+    assert response.status_code == 200
+    assert {user["id"]: user["todo_count"] for user in response.json()["users"]} == dict(zip(user_ids, [1, 2, 3]))
+
+
+def test_rebalance_renumbers_taken_ids_and_tombstones_them(engines):
+    main, shards = engines
+    # Owner 1 belongs in shard 1 but its todos 1 and 2 are in shard 0, and shard 1 already uses id 1
+    with Session(shards[0]) as db:
+        for title in ("first", "second"):
+            add_todo(db, 1, title=title)
+        version = get_todo_version(db, 1)
+    with Session(shards[1]) as db:
+        add_todo(db, 3, title="already there")
+
+    assert rebalance() == (1, 1)
+
+    with Session(shards[1]) as db:
+        moved = db.execute(select(Todos.id, Todos.title, Todos.revision).where(Todos.owner_id == 1)).all()
+        assert sorted(title for _, title, _ in moved) == ["first", "second"]
+        (renumbered_id, _, revision), = [row for row in moved if row.title == "first"]
+        assert renumbered_id not in (1, 2)
+        assert revision > version
+        # Delta-sync clients are told the old id is gone and get the row again under its new id
+        assert db.execute(select(TodoTombstones.todo_id, TodoTombstones.revision).where(
+            TodoTombstones.owner_id == 1
+        )).all() == [(1, revision)]
+        assert [row.id for row in moved if row.title == "second"] == [2]
+        assert get_todo_stats(db, 1)["total"] == 2
+        assert owner_titles(shards[1], 3) == ["already there"]
+    with Session(shards[0]) as db:
+        for table in (Todos, TodoStats, TodoTombstones):
+            assert db.scalars(select(table.owner_id).where(table.owner_id == 1)).all() == []
+
+    # Everything is where it belongs now
+    assert rebalance() == (0, 0)
+
+
+def test_sharded_account_delete(engines, sharded_client):
+    main, shards = engines
+    leaving, staying = add_user(main, "leaving"), add_user(main, "staying")
+    for user_id in (leaving, staying):
+        with Session(shards[user_id % 2]) as db:
+            add_todo(db, user_id)
+
+    response = sharded_client.delete(f"/auth/{leaving}", params={"token": token_for(leaving)})
+    assert response.status_code == 200
+
+    with Session(main) as db:
+        assert db.scalars(select(Users.id)).all() == [staying]
+    with Session(shards[leaving % 2]) as db:
+        for table in (Todos, TodoStats, TodoTombstones):
+            assert db.scalars(select(table.owner_id).where(table.owner_id == leaving)).all() == []
+    assert owner_titles(shards[staying % 2], staying) == ["todo"]
+    # The account's token is refused from now on
+    assert sharded_client.get(f"/{leaving}/todos", params={"token": token_for(leaving)}).status_code == 401
@@ -0,0 +1,130 @@
+from sqlalchemy import func, insert, select
+
+from conftest import run_concurrently
+from models import Todos, TodoTombstones, Users
+from todo_stats import get_todo_stats, get_todo_version
+from test_todo_stats import add_todo
+
+
+def new_todo(n, **values):
+    return {"title": f"todo {n}", "description": "batch", "priority": n % 5 + 1, **values}
+
+
+def owner_todos(db, owner_id):
+    return db.execute(
+        select(Todos.id, Todos.title, Todos.complete, Todos.revision)
+        .where(Todos.owner_id == owner_id)
+        .order_by(Todos.id)
+    ).all()
+
+
+def other_user_todo(db):
+    other_id = db.scalar(
+        insert(Users).values(user_name="other", email="other@example.com", hashed_password="x").returning(Users.id)
+    )
+    add_todo(db, other_id, title="not yours")
+    return other_id, db.scalar(select(Todos.id).where(Todos.owner_id == other_id))
+
+
+def test_batch_create(client, db, owner_id, token):
+    response = client.post(f"/{owner_id}/todos/batch", params={"token": token}, json={
+        "todos": [new_todo(1), new_todo(2, complete=True), new_todo(3)]
+    })
+    assert response.status_code == 201, response.text
+    todos = owner_todos(db, owner_id)
+    assert response.json() == {"results": [{"id": todo.id, "status": "created"} for todo in todos]}
+    assert [todo.title for todo in todos] == ["todo 1", "todo 2", "todo 3"]
+    # One transaction, one version for the whole batch
+    assert {todo.revision for todo in todos} == {get_todo_version(db, owner_id)} == {1}
+    stats = get_todo_stats(db, owner_id)
+    assert (stats["total"], stats["completed"], stats["by_priority"]["2"]) == (3, 1, 1)
+
+
+def test_invalid_batches_change_nothing(client, db, owner_id, token):
+    add_todo(db, owner_id)
+    todo_id = owner_todos(db, owner_id)[0].id
+    url, params = f"/{owner_id}/todos/batch", {"token": token}
+
+    assert client.post(url, params=params, json={"todos": [new_todo(1), new_todo(2, priority=9)]}).status_code == 422
+    assert client.post(url, params=params, json={"todos": []}).status_code == 422
+    assert client.patch(url, params=params, json={
+        "todos": [{"id": todo_id, "complete": True}, {"id": todo_id, "title": "twice"}]
+    }).status_code == 422
+    assert client.patch(url, params=params, json={"todos": [{"id": todo_id}]}).status_code == 422
+    assert client.request("DELETE", url, params=params, json={"ids": []}).status_code == 422
+
+    assert owner_todos(db, owner_id) == [(todo_id, "todo", False, 1)]
+    assert get_todo_version(db, owner_id) == 1
+
+
+def test_batch_update(client, db, owner_id, token):
+    for priority in (1, 2, 3):
+        add_todo(db, owner_id, priority=priority)
+    first, second, third = (todo.id for todo in owner_todos(db, owner_id))
+    other_id, other_todo_id = other_user_todo(db)
+
+    response = client.patch(f"/{owner_id}/todos/batch", params={"token": token}, json={"todos": [
+        {"id": first, "complete": True},
+        {"id": second, "title": "renamed", "priority": 5},
+        {"id": other_todo_id, "title": "taken over"},
+        {"id": third + 1000, "complete": True},
+    ]})
+    assert response.status_code == 200, response.text
+    assert response.json()["results"] == [
+        {"id": first, "status": "updated"}, {"id": second, "status": "updated"},
+        {"id": other_todo_id, "status": "not_found"}, {"id": third + 1000, "status": "not_found"},
+    ]
+    assert owner_todos(db, owner_id) == [
+        (first, "todo", True, 4), (second, "renamed", False, 4), (third, "todo", False, 3)
+    ]
+    assert owner_todos(db, other_id) == [(other_todo_id, "not yours", False, 1)]
+    stats = get_todo_stats(db, owner_id)
+    assert (stats["total"], stats["completed"]) == (3, 1)
+    assert stats["by_priority"] == {"1": 1, "2": 0, "3": 1, "4": 0, "5": 1}
+
+
+def test_batch_update_of_no_owned_todo_keeps_the_version(client, db, owner_id, token):
+    add_todo(db, owner_id)
+    _, other_todo_id = other_user_todo(db)
+    response = client.patch(f"/{owner_id}/todos/batch", params={"token": token}, json={
+        "todos": [{"id": other_todo_id, "complete": True}]
+    })
+    assert response.json()["results"] == [{"id": other_todo_id, "status": "not_found"}]
+    assert get_todo_version(db, owner_id) == 1
+
+
+def test_batch_delete(client, db, owner_id, token):
+    for complete in (True, False, False):
+        add_todo(db, owner_id, complete=complete)
+    first, second, third = (todo.id for todo in owner_todos(db, owner_id))
+    other_id, other_todo_id = other_user_todo(db)
+
+    response = client.request("DELETE", f"/{owner_id}/todos/batch", params={"token": token}, json={
+        "ids": [first, other_todo_id, third]
+    })
+    assert response.json()["results"] == [
+        {"id": first, "status": "deleted"}, {"id": other_todo_id, "status": "not_found"},
+        {"id": third, "status": "deleted"},
+    ]
+    assert [todo.id for todo in owner_todos(db, owner_id)] == [second]
+    assert [todo.id for todo in owner_todos(db, other_id)] == [other_todo_id]
+    tombstones = db.execute(select(TodoTombstones.todo_id, TodoTombstones.revision).where(
+        TodoTombstones.owner_id == owner_id
+    ).order_by(TodoTombstones.todo_id)).all()
+    assert tombstones == [(first, 4), (third, 4)]
+    stats = get_todo_stats(db, owner_id)
+    assert (stats["total"], stats["completed"]) == (1, 0)
+
+
+def test_concurrent_batch_updates_keep_counters_exact(db, owner_id, token, client):
+    for _ in range(10):
+        add_todo(db, owner_id)
+    patch = {"todos": [{"id": todo.id, "complete": True} for todo in owner_todos(db, owner_id)]}
+
+    responses = run_concurrently(
+        [("PATCH", f"/{owner_id}/todos/batch", {"params": {"token": token}, "json": patch})] * 40
+    )
+    assert {response.status_code for response in responses} == {200}
+    stats = get_todo_stats(db, owner_id)
+    completed = db.scalar(select(func.count()).where(Todos.owner_id == owner_id, Todos.complete.is_(True)))
+    assert (stats["total"], stats["completed"], stats["pending"]) == (10, completed, 0) == (10, 10, 0)
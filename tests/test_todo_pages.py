@@ -0,0 +1,59 @@
+from sqlalchemy import insert, select
+
+from models import Todos, Users
+from utils import split_page, todos_page_statement
+from test_todo_stats import add_todo
+
+
+def read_pages(db, owner_id, limit, **filters):
+    """Follow next_cursor from the first page to the last; returns the pages as lists of ids."""
+    pages, cursor = [], None
+    while True:
+        rows = db.execute(todos_page_statement(owner_id, limit, cursor, **filters)).all()
+        rows, cursor = split_page(rows, limit)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_todo_once(db, owner_id):
+    other_id = db.scalar(
+        insert(Users).values(user_name="other", email="other@example.com", hashed_password="x").returning(Users.id)
+    )
+    for _ in range(7):
+        add_todo(db, owner_id)
+        add_todo(db, other_id)
+    ids = db.scalars(select(Todos.id).where(Todos.owner_id == owner_id).order_by(Todos.id)).all()
+
+    pages = read_pages(db, owner_id, 3)
+    assert pages == [ids[0:3], ids[3:6], ids[6:7]]
+
+
+def test_last_full_page_has_no_next_cursor(db, owner_id):
+    for _ in range(4):
+        add_todo(db, owner_id)
+    rows, next_cursor = split_page(db.execute(todos_page_statement(owner_id, 4)).all(), 4)
+    assert len(rows) == 4 and next_cursor is None
+
+
+def test_filters_apply_on_every_page(db, owner_id):
+    titles = ["Groceries", "groceries list", "GROCERIES run", "gym", "grocer", "groceries later"]
+    for n, title in enumerate(titles):
+        add_todo(db, owner_id, complete=n != 5, priority=n % 5 + 1, title=title)
+
+    pages = read_pages(db, owner_id, 1, title_prefix="groceries", complete=True, min_priority=2)
+    titles_by_id = {row.id: row.title for row in db.execute(todos_page_statement(owner_id, 100)).all()}
+    assert [[titles_by_id[todo_id] for todo_id in page] for page in pages] == [["groceries list"], ["GROCERIES run"]]
+
+
+def test_title_prefix_ignores_case_and_like_wildcards(db, owner_id):
+    for title in ("Report", "report draft", "re_port", "100% done"):
+        add_todo(db, owner_id, title=title)
+    titles = [row.title for row in db.execute(todos_page_statement(owner_id, 10, title_prefix="REPORT")).all()]
+    assert titles == ["Report", "report draft"]
+    assert [row.title for row in db.execute(todos_page_statement(owner_id, 10, title_prefix="re_")).all()] == [
+        "re_port"
+    ]
+    assert [row.title for row in db.execute(todos_page_statement(owner_id, 10, title_prefix="100%")).all()] == [
+        "100% done"
+    ]
@@ -0,0 +1,37 @@
+from sqlalchemy import insert
+
+from models import Users
+from todo_search import rebuild_search_index, search_todos
+from test_todo_stats import add_todo
+
+
+def titles(rows):
+    return [row["title"] for row in rows]
+
+
+def test_search_ranks_title_matches_first_and_stays_in_owner(db, owner_id):
+    other_id = db.scalar(
+        insert(Users).values(user_name="other", email="other@example.com", hashed_password="x").returning(Users.id)
+    )
+    add_todo(db, owner_id, title="call plumber", description="about the groceries bill")
+    add_todo(db, owner_id, title="buy groceries", description="milk and eggs")
+    add_todo(db, owner_id, title="water plants")
+    add_todo(db, other_id, title="groceries for other")
+
+    assert titles(search_todos(db, owner_id, "groceries")) == ["buy groceries", "call plumber"]
+    assert titles(search_todos(db, owner_id, "gro")) == ["buy groceries", "call plumber"]
+    assert search_todos(db, owner_id, "gro", prefix=False) == []
+    assert titles(search_todos(db, owner_id, "milk groceries")) == ["buy groceries"]
+
+
+def test_search_input_is_not_query_syntax(db, owner_id):
+    add_todo(db, owner_id, title="buy groceries")
+    assert search_todos(db, owner_id, "*") == []
+    assert titles(search_todos(db, owner_id, 'groceries" OR owner_id:"0')) == []
+    assert titles(search_todos(db, owner_id, "groceries & | !")) == ["buy groceries"]
+
+
+def test_rebuilt_index_finds_the_same_todos(db, owner_id):
+    add_todo(db, owner_id, title="buy groceries")
+    rebuild_search_index(db)
+    assert titles(search_todos(db, owner_id, "groceries")) == ["buy groceries"]
@@ -0,0 +1,69 @@
+from sqlalchemy import func, insert, select, update
+
+from conftest import run_concurrently
+from models import Todos, TodoStats
+from todo_stats import apply_todo_stats_delta, get_todo_stats, get_todo_version, rebuild_todo_stats, todo_stats_delta
+
+
+def add_todo(db, owner_id, complete=False, priority=1, title="todo", description=""):
+    revision = apply_todo_stats_delta(db, owner_id, todo_stats_delta([(complete, priority)]))
+    db.execute(insert(Todos).values(
+        owner_id=owner_id, title=title, description=description, complete=complete, priority=priority, revision=revision
+    ))
+    db.commit()
+    return revision
+
+
+def test_upsert_counts_and_bumps_version(db, owner_id):
+    assert [add_todo(db, owner_id, complete=n % 2 == 0, priority=n) for n in (1, 2, 3)] == [1, 2, 3]
+    stats = get_todo_stats(db, owner_id)
+    assert (stats["total"], stats["completed"], stats["pending"]) == (3, 1, 2)
+    assert stats["by_priority"] == {"1": 1, "2": 1, "3": 1, "4": 0, "5": 0}
+    assert get_todo_version(db, owner_id) == 3
+
+
+def test_rebuild_fixes_counters_without_moving_version_back(db, owner_id):
+    for priority in (1, 5):
+        add_todo(db, owner_id, priority=priority)
+    # Counters drifted from the todos
+    db.execute(update(TodoStats).values(total=7, priority_5=0))
+    db.commit()
+    version = get_todo_version(db, owner_id)
+
+    assert rebuild_todo_stats(db) == 1
+    stats = get_todo_stats(db, owner_id)
+    assert (stats["total"], stats["by_priority"]["5"]) == (2, 1)
+    # The counters changed, so the version (the ETag) must too, and never to one handed out before
+    assert get_todo_version(db, owner_id) > version
+
+
+def test_rebuild_zeroes_owner_without_todos(db, owner_id):
+    add_todo(db, owner_id)
+    db.execute(Todos.__table__.delete())
+    db.commit()
+    version = get_todo_version(db, owner_id)
+
+    rebuild_todo_stats(db, owner_id)
+    assert get_todo_stats(db, owner_id)["total"] == 0
+    assert get_todo_version(db, owner_id) > version
+
+
+def test_concurrent_updates_and_deletes_keep_counters_exact(client, db, owner_id, token):
+    for priority in range(1, 11):
+        add_todo(db, owner_id, priority=priority % 5 + 1)
+    todo_ids = db.scalars(select(Todos.id).where(Todos.owner_id == owner_id)).all()
+    params = {"token": token, "title": "patched", "description": "patched", "priority": 3, "complete": True}
+
+    requests = [("PATCH", f"/{owner_id}/todos/{todo_id}", {"params": params}) for todo_id in todo_ids] * 16
+    requests += [("DELETE", f"/{owner_id}/todos/{todo_id}", {"params": {"token": token}}) for todo_id in todo_ids[:3]]
+    responses = run_concurrently(requests)
+    # Patches of a todo deleted first find nothing
+    assert {response.status_code for response in responses} <= {200, 202, 404}
+
+    stats = get_todo_stats(db, owner_id)
+    counts = db.execute(
+        select(func.count(), func.count().filter(Todos.complete.is_(True)), func.count().filter(Todos.priority == 3))
+        .where(Todos.owner_id == owner_id)
+    ).one()
+    assert (stats["total"], stats["completed"], stats["by_priority"]["3"]) == tuple(counts) == (7, 7, 7)
+    assert stats["pending"] == 0
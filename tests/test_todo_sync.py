@@ -0,0 +1,42 @@
+from sqlalchemy import delete, select
+
+from models import Todos
+from todo_stats import apply_todo_stats_delta, get_todo_version, rebuild_todo_stats, reset_todo_stats
+from todo_sync import get_todo_changes, tombstone_all_todos
+from test_todo_stats import add_todo
+
+
+def test_changes_since_and_cursor_pages(db, owner_id):
+    revisions = [add_todo(db, owner_id) for _ in range(5)]
+
+    changes, next_cursor = get_todo_changes(db, owner_id, since=revisions[1], limit=2)
+    assert [change["revision"] for change in changes] == revisions[2:4]
+    changes, next_cursor = get_todo_changes(db, owner_id, cursor=tuple(map(int, next_cursor.split("."))), limit=2)
+    assert [change["revision"] for change in changes] == revisions[4:]
+    assert next_cursor is None
+
+
+def test_deleted_todos_are_reported(db, owner_id):
+    add_todo(db, owner_id)
+    since = add_todo(db, owner_id)
+    todo_ids = db.scalars(select(Todos.id).where(Todos.owner_id == owner_id)).all()
+    revision = reset_todo_stats(db, owner_id)
+    tombstone_all_todos(db, owner_id, revision)
+    db.execute(delete(Todos).where(Todos.owner_id == owner_id))
+    db.commit()
+
+    changes, _ = get_todo_changes(db, owner_id, since=since)
+    assert [(change["id"], change["deleted"]) for change in changes] == [(todo_id, True) for todo_id in todo_ids]
+
+
+def test_revisions_keep_increasing_across_rebuild(db, owner_id):
+    since = max(add_todo(db, owner_id) for _ in range(3))
+    rebuild_todo_stats(db)
+    assert get_todo_version(db, owner_id) > since
+
+    # A write after the rebuild must land after every revision a client may already have synced to
+    revision = add_todo(db, owner_id)
+    assert revision > since
+    changes, _ = get_todo_changes(db, owner_id, since=since)
+    assert [change["revision"] for change in changes] == [revision]
+    assert apply_todo_stats_delta(db, owner_id, {}) > revision
@@ -0,0 +1,71 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, update
+
+from exceptions import ValidateTokenError
+from models import Users
+from utils import TokenCache, TokenEpochs, get_jwt_token, token_cache, token_epochs, validate_token
+
+
+@pytest.fixture(autouse=True)
+def fresh_token_state():
+    yield
+    token_cache.clear()
+    token_epochs._epochs.clear()
+
+
+def test_cached_token_is_refused_after_epoch_bump():
+    token = get_jwt_token("owner", 41, timedelta(minutes=5))
+    assert validate_token(token)["user_id"] == 41
+    assert token_cache.peek(token) is not None
+
+    token_epochs.bump(41, 1)
+    with pytest.raises(ValidateTokenError) as exc_info:
+        validate_token(token)
+    assert exc_info.value.status_code == 401
+    assert validate_token(get_jwt_token("owner", 41, timedelta(minutes=5), epoch=1))["epoch"] == 1
+
+
+def test_cached_token_is_refused_after_expiry():
+    token = get_jwt_token("owner", 42, timedelta(seconds=1))
+    validate_token(token)
+    assert token_cache.peek(token) is not None
+
+    # exp has whole-second resolution and jose accepts a token during its exp second
+    time.sleep(2.1)
+    assert token_cache.peek(token) is None
+    with pytest.raises(ValidateTokenError):
+        validate_token(token)
+
+
+def test_cache_is_bounded():
+    cache = TokenCache(2)
+    for user_id in (1, 2, 3):
+        cache.put(f"token{user_id}", {"user_id": user_id}, time.time() + 60)
+    assert cache.peek("token1") is None
+    assert cache.peek("token3") == {"user_id": 3}
+    assert cache.stats()["size"] == 2
+
+
+def test_refresh_only_rereads_recently_bumped_users(db, backend_engine, owner_id):
+    # Bumped a day ago, well before the overlap of one refresh with the previous one
+    db.execute(update(Users).where(Users.id == owner_id).values(
+        token_epoch=3, token_epoch_changed_at=datetime.utcnow() - timedelta(days=1)
+    ))
+    db.commit()
+    epochs = TokenEpochs(backend_engine)
+    # The first refresh (at startup) loads every bumped user, later ones only the recent changes
+    assert epochs.refresh() == 1
+    assert epochs.get(owner_id) == 3
+    assert epochs.refresh() == 0
+
+    # Bumped through another worker
+    other_id = db.scalar(insert(Users).values(
+        user_name="other", email="other@example.com", hashed_password="x", token_epoch=1,
+        token_epoch_changed_at=func.now()
+    ).returning(Users.id))
+    db.commit()
+    assert epochs.refresh() == 1
+    assert (epochs.get(owner_id), epochs.get(other_id)) == (3, 1)
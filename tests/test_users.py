@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from models import Todos, TodoStats, TodoTombstones, Users
+from todo_stats import reset_todo_stats
+from todo_sync import record_tombstones
+from utils import get_jwt_token
+from test_todo_stats import add_todo
+
+
+def token_for(user_id):
+    return get_jwt_token("owner", user_id, timedelta(minutes=5))
+
+
+def test_delete_account_removes_owned_rows_first(client, db, owner_id):
+    for _ in range(3):
+        add_todo(db, owner_id)
+    record_tombstones(db, owner_id, [1000], reset_todo_stats(db, owner_id))
+    db.commit()
+
+    response = client.delete(f"/auth/{owner_id}", params={"token": token_for(owner_id)})
+    assert response.status_code == 200, response.text
+    for table in (Users, Todos, TodoStats, TodoTombstones):
+        column = table.id if table is Users else table.owner_id
+        assert db.scalar(select(func.count()).select_from(table).where(column == owner_id)) == 0
+
+
+def test_delete_missing_account_is_404_and_deletes_nothing(client, db, owner_id):
+    missing_id = owner_id + 1
+    add_todo(db, owner_id)
+
+    response = client.delete(f"/auth/{missing_id}", params={"token": token_for(missing_id)})
+    assert response.status_code == 404
+    assert db.scalar(select(func.count()).select_from(Todos)) == 1
+
+
+def test_deleted_account_tokens_are_refused(client, db, owner_id):
+    token = token_for(owner_id)
+    assert client.delete(f"/auth/{owner_id}", params={"token": token}).status_code == 200
+    response = client.get(f"/{owner_id}/todos", params={"token": token})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked, please generate a new one"
+
+
+def test_user_ids_are_not_reused(db, owner_id):
+    db.execute(delete(Users).where(Users.id == owner_id))
+    db.commit()
+    new_id = db.scalar(
+        insert(Users).values(user_name="new", email="new@example.com", hashed_password="x").returning(Users.id)
+    )
+    db.commit()
+    assert new_id > owner_id
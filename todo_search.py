@@ -0,0 +1,75 @@
+import re
+from sqlalchemy import Boolean, Float, Integer, String, column, text
+
+SEARCH_COLUMNS = (
+    column("id", Integer), column("title", String), column("description", String),
+    column("priority", Integer), column("complete", Boolean), column("score", Float)
+)
+# Weights for bm25() follow the FTS5 column order (title, description, owner_id); owner_id is only a filter
+SEARCH_STATEMENT = text(
+    """
+    SELECT todos.id, todos.title, todos.description, todos.priority, todos.complete,
+           bm25(todos_fts, 10.0, 5.0, 0.0) AS score
+    FROM todos_fts
+    JOIN todos ON todos.id = todos_fts.rowid
+    WHERE todos_fts MATCH :match AND todos.owner_id = :owner_id
+    ORDER BY score
+    LIMIT :limit
+    """
+).columns(*SEARCH_COLUMNS)
+# PostgreSQL ranks the generated todos.search_vector column (title weighted A, description B)
+POSTGRES_SEARCH_STATEMENT = text(
+    """
+    SELECT todos.id, todos.title, todos.description, todos.priority, todos.complete,
+           ts_rank(todos.search_vector, query) AS score
+    FROM todos, to_tsquery('simple', :match) AS query
+    WHERE todos.search_vector @@ query AND todos.owner_id = :owner_id
+    ORDER BY score DESC
+    LIMIT :limit
+    """
+).columns(*SEARCH_COLUMNS)
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(owner_id, query, prefix=True):
+    """Turn free text into an FTS5 MATCH expression scoped to one owner.
+
+    Terms are quoted so user input can never inject FTS5 operators; with prefix=True every
+    term also matches words starting with it ("gro" finds "groceries"). The owner_id term
+    lets FTS5 intersect with that owner's postings instead of filtering every match afterwards.
+    """
+    terms = TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    suffix = "*" if prefix else ""
+    phrase = " ".join(f'"{term}"{suffix}' for term in terms)
+    return f'owner_id:"{int(owner_id)}" AND {{title description}}:({phrase})'
+
+
+def build_tsquery(query, prefix=True):
+    """Turn free text into a PostgreSQL tsquery ANDing every term, as the FTS5 query does."""
+    terms = TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    suffix = ":*" if prefix else ""
+    return " & ".join(f"{term}{suffix}" for term in terms)
+
+
+def search_todos(db, owner_id, query, prefix=True, limit=20):
+    if db.get_bind().dialect.name == "postgresql":
+        statement, match = POSTGRES_SEARCH_STATEMENT, build_tsquery(query, prefix)
+    else:
+        statement, match = SEARCH_STATEMENT, build_match_query(owner_id, query, prefix)
+    if match is None:
+        return []
+    rows = db.execute(statement, {"match": match, "owner_id": owner_id, "limit": limit})
+    return [dict(row._mapping) for row in rows]
+
+
+def rebuild_search_index(db):
+    if db.get_bind().dialect.name == "postgresql":
+        # The tsvector column is generated by the server and never stale; only the index can bloat
+        db.execute(text("REINDEX INDEX ix_todos_search_vector"))
+    else:
+        db.execute(text("INSERT INTO todos_fts(todos_fts) VALUES('rebuild')"))
+    db.commit()
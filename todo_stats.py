@@ -0,0 +1,139 @@
+from collections import Counter
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Todos, TodoStats
+
+PRIORITY_COLUMNS = {priority: f"priority_{priority}" for priority in range(1, 6)}
+COUNTER_COLUMNS = ("total", "completed", *PRIORITY_COLUMNS.values())
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def todo_stats_delta(rows, sign=1):
+    """Counter changes for todos given as (complete, priority) pairs being added (sign=1) or removed (sign=-1)."""
+    delta = Counter()
+    for complete, priority in rows:
+        delta["total"] += sign
+        if complete:
+            delta["completed"] += sign
+        if priority in PRIORITY_COLUMNS:
+            delta[PRIORITY_COLUMNS[priority]] += sign
+    return delta
+
+
+def _upsert_todo_stats(db, owner_id, values, set_):
+    upsert = UPSERT_INSERTS[db.get_bind(TodoStats).dialect.name]
+    statement = upsert(TodoStats).values(owner_id=owner_id, version=1, **values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TodoStats.owner_id],
+        set_={**set_(statement.excluded), "version": TodoStats.version + 1}
+    )
+    return db.execute(statement.returning(TodoStats.version)).scalar_one()
+
+
+def apply_todo_stats_delta(db, owner_id, delta):
+    """Record a write to the owner's todos inside the caller's transaction (one upsert, no read).
+
+    Adds delta to the counters and bumps the owner's version; returns the new version. Only for
+    deltas known without reading todos (new rows); changes to existing todos use lock_todo_stats.
+    """
+    changed = [column for column in COUNTER_COLUMNS if delta.get(column)]
+    return _upsert_todo_stats(
+        db, owner_id,
+        {column: delta.get(column, 0) for column in COUNTER_COLUMNS},
+        lambda excluded: {column: getattr(TodoStats, column) + excluded[column] for column in changed}
+    )
+
+
+def lock_todo_stats(db, owner_id):
+    """Start a change to the owner's existing todos: bump their version and return it.
+
+    The upsert write-locks the owner's stats row until the caller commits (a row lock on
+    PostgreSQL, the database write lock on SQLite), so concurrent writers of the owner queue
+    here. Read the todo values a counter delta depends on only after this call, then pass
+    the delta to add_todo_stats: reading them first lets two writers apply the same change.
+    """
+    return apply_todo_stats_delta(db, owner_id, {})
+
+
+def add_todo_stats(db, owner_id, delta):
+    """Add delta to the counters of an owner whose stats row lock_todo_stats already locked."""
+    values = {column: getattr(TodoStats, column) + delta[column] for column in COUNTER_COLUMNS if delta.get(column)}
+    if values:
+        db.execute(update(TodoStats).where(TodoStats.owner_id == owner_id).values(**values))
+
+
+def reset_todo_stats(db, owner_id):
+    """Zero the owner's counters after all their todos were deleted; returns the new version."""
+    return _upsert_todo_stats(
+        db, owner_id,
+        dict.fromkeys(COUNTER_COLUMNS, 0),
+        lambda excluded: dict.fromkeys(COUNTER_COLUMNS, 0)
+    )
+
+
+def todo_version_statement(owner_id):
+    return select(TodoStats.version).where(TodoStats.owner_id == owner_id)
+
+
+def get_todo_version(db, owner_id):
+    """Monotonic per-owner counter bumped by every todo write; 0 before the first one."""
+    return db.scalar(todo_version_statement(owner_id)) or 0
+
+
+def get_todo_stats(db, owner_id):
+    row = db.execute(
+        select(*(getattr(TodoStats, column) for column in COUNTER_COLUMNS)).where(TodoStats.owner_id == owner_id)
+    ).first()
+    counts = dict(row._mapping) if row else dict.fromkeys(COUNTER_COLUMNS, 0)
+    return {
+        "total": counts["total"],
+        "completed": counts["completed"],
+        "pending": counts["total"] - counts["completed"],
+        "by_priority": {str(priority): counts[column] for priority, column in PRIORITY_COLUMNS.items()},
+    }
+
+
+def todo_stats_aggregate(owner_id=None):
+    """SELECT computing every counter straight from todos, grouped by owner."""
+    statement = select(
+        Todos.owner_id,
+        func.count(Todos.id).label("total"),
+        func.coalesce(func.sum(case((Todos.complete.is_(True), 1), else_=0)), 0).label("completed"),
+        *(
+            func.coalesce(func.sum(case((Todos.priority == priority, 1), else_=0)), 0).label(column)
+            for priority, column in PRIORITY_COLUMNS.items()
+        )
+    ).where(Todos.owner_id.is_not(None)).group_by(Todos.owner_id)
+    if owner_id is not None:
+        statement = statement.where(Todos.owner_id == owner_id)
+    return statement
+
+
+def rebuild_todo_stats(db, owner_id=None):
+    """Recompute counters from the todos table, for one owner or everyone. Returns the number of owners with todos.
+
+    Versions only move forward: each rebuilt row gets one above both its old version and the
+    owner's newest todo revision, so earlier ETags and delta-sync cursors never come back.
+    """
+    # Owners without todos keep their row, zeroed, rather than restarting at version 0
+    zero = update(TodoStats).values(**dict.fromkeys(COUNTER_COLUMNS, 0), version=TodoStats.version + 1)
+    if owner_id is not None:
+        zero = zero.where(TodoStats.owner_id == owner_id)
+    db.execute(zero)
+
+    upsert = UPSERT_INSERTS[db.get_bind(TodoStats).dialect.name]
+    statement = upsert(TodoStats).from_select(
+        ["owner_id", *COUNTER_COLUMNS, "version"],
+        todo_stats_aggregate(owner_id).add_columns((func.max(Todos.revision) + 1).label("version"))
+    )
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=[TodoStats.owner_id],
+        set_={
+            **{column: excluded[column] for column in COUNTER_COLUMNS},
+            "version": case((excluded.version > TodoStats.version, excluded.version), else_=TodoStats.version),
+        }
+    )
+    result = db.execute(statement)
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,60 @@
+from sqlalchemy import insert, literal, select, tuple_
+from models import Todos, TodoTombstones
+
+SYNC_COLUMNS = ("id", "title", "description", "priority", "complete", "revision", "updated_at")
+
+
+def record_tombstones(db, owner_id, todo_ids, revision):
+    if todo_ids:
+        db.execute(insert(TodoTombstones), [
+            {"owner_id": owner_id, "todo_id": todo_id, "revision": revision} for todo_id in todo_ids
+        ])
+
+
+def tombstone_all_todos(db, owner_id, revision):
+    """Tombstone every todo of the owner with one INSERT ... SELECT; run it before the DELETE."""
+    db.execute(insert(TodoTombstones).from_select(
+        ["owner_id", "todo_id", "revision"],
+        select(Todos.owner_id, Todos.id, literal(revision)).where(Todos.owner_id == owner_id)
+    ))
+
+
+def parse_sync_cursor(cursor):
+    revision, todo_id = cursor.split(".")
+    return int(revision), int(todo_id)
+
+
+def get_todo_changes(db, owner_id, since=None, cursor=None, limit=100):
+    """Rows written and todos deleted after `since` (or after `cursor`), ordered by (revision, id).
+
+    Both sources are read through (owner_id, revision, id) indexes, so the cost follows the
+    number of changes rather than the size of the list.
+    """
+    todos = select(*(getattr(Todos, column) for column in SYNC_COLUMNS)).where(Todos.owner_id == owner_id)
+    tombstones = select(TodoTombstones.todo_id, TodoTombstones.revision, TodoTombstones.deleted_at).where(
+        TodoTombstones.owner_id == owner_id
+    )
+    if cursor is not None:
+        todos = todos.where(tuple_(Todos.revision, Todos.id) > cursor)
+        tombstones = tombstones.where(tuple_(TodoTombstones.revision, TodoTombstones.todo_id) > cursor)
+    elif since is not None:
+        todos = todos.where(Todos.revision > since)
+        tombstones = tombstones.where(TodoTombstones.revision > since)
+
+    changes = [
+        {**row._mapping, "deleted": False}
+        for row in db.execute(todos.order_by(Todos.revision, Todos.id).limit(limit + 1))
+    ]
+    changes += [
+        {"id": row.todo_id, "revision": row.revision, "deleted_at": row.deleted_at, "deleted": True}
+        for row in db.execute(
+            tombstones.order_by(TodoTombstones.revision, TodoTombstones.todo_id).limit(limit + 1)
+        )
+    ]
+    changes.sort(key=lambda change: (change["revision"], change["id"]))
+
+    next_cursor = None
+    if len(changes) > limit:
+        changes = changes[:limit]
+        next_cursor = f"{changes[-1]['revision']}.{changes[-1]['id']}"
+    return changes, next_cursor
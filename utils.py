@@ -1,33 +1,185 @@
-from sqlalchemy import and_
-from database import SessionLocal
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import and_, func, select
 from datetime import timedelta, datetime
-from fastapi import status
-from passlib.context import CryptContext
+from fastapi import Request, status
+from config import TOKEN_CACHE_SIZE
 from exceptions import InvalidCredentialsException, ValidateTokenError
-from jose import jwt, JWTError
+from metrics import timed
+from database import engine
+from models import Todos, TodoStats, Users
+from sharding import async_user_session, user_session
 
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 SECRET_KEY = "TODOS_@2023"
 algorithm = "HS256"
+# A refresh re-reads the epochs changed this long before the previous one started: token_epoch_changed_at
+# is set when the change's transaction runs, which can be a moment before it commits and becomes visible
+TOKEN_EPOCH_REFRESH_OVERLAP = timedelta(seconds=60)
 
 
-def get_db():
-    db = SessionLocal()
+class TokenCache:
+    """Bounded LRU of already verified tokens, keyed by a digest of the token.
+
+    Entries hold the decoded claims and are dropped once the token's exp has passed,
+    so a cached token is never accepted for longer than jwt.decode would accept it.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(claims)
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def peek(self, token: str):
+        """Claims of a cached, unexpired token, without touching the LRU order or the hit counters."""
+        with self._lock:
+            entry = self._entries.get(self._key(token))
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    def put(self, token: str, claims: dict, expires_at: float):
+        if self.max_size <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (dict(claims), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+
+class TokenEpochs:
+    """Users' token epochs, checked on every token validation with one dict lookup.
+
+    A token whose epoch claim is below its user's epoch was issued before their last password
+    or user name change and is refused. Only users whose epoch was ever bumped are held. Bumps
+    made by this worker apply at once; refresh() loads the ones made by other workers (see
+    TODOS_TOKEN_EPOCH_REFRESH_SECONDS) and runs at startup before the first request. Only the
+    first refresh reads every bumped user; later ones read the users bumped since the previous one.
+    """
+
+    def __init__(self, bind):
+        self.bind = bind
+        self._epochs = {}
+        self._lock = threading.Lock()
+        self._changed_since = None
+
+    def get(self, user_id: int) -> int:
+        return self._epochs.get(user_id, 0)
+
+    def bump(self, user_id: int, epoch: int):
+        with self._lock:
+            if epoch > self._epochs.get(user_id, 0):
+                self._epochs[user_id] = epoch
+
+    def refresh(self):
+        # Users live in the main database; the token_epoch and token_epoch_changed_at indexes keep this
+        # to the bumped users. The database clock sets and compares changed_at, so worker clocks do not matter
+        statement = select(Users.id, Users.token_epoch)
+        with self.bind.connect() as connection:
+            started = connection.scalar(select(func.now()))
+            if self._changed_since is None:
+                statement = statement.where(Users.token_epoch > 0)
+            else:
+                statement = statement.where(Users.token_epoch_changed_at >= self._changed_since)
+            rows = connection.execute(statement).all()
+        for user_id, epoch in rows:
+            self.bump(user_id, epoch)
+        self._changed_since = started - TOKEN_EPOCH_REFRESH_OVERLAP
+        return len(rows)
+
+    def stats(self):
+        return {"users": len(self._epochs)}
+
+
+token_epochs = TokenEpochs(engine)
+
+
+def path_user_id(request: Request):
+    """The {user_id} path parameter as an int, None if the route has none (or it is not a number)."""
+    user_id = request.path_params.get("user_id")
+    return int(user_id) if user_id is not None and str(user_id).isdigit() else None
+
+
+def get_db(request: Request):
+    # With sharding, routes under a {user_id} get a session on that user's shard
+    db = user_session(path_user_id(request))
     try:
         yield db
     finally:
         db.close()
 
 
-def get_jwt_token(user_name: str, user_id: int, expire_time: timedelta):
-    encode = {'sub': user_name, 'id': user_id}
+async def get_async_db(request: Request):
+    async with async_user_session(path_user_id(request)) as db:
+        yield db
+
+
+def get_jwt_token(user_name: str, user_id: int, expire_time: timedelta, epoch: int = 0):
+    encode = {'sub': user_name, 'id': user_id, 'epoch': epoch}
     expiry = datetime.utcnow() + expire_time
     encode.update({'exp': expiry})
+    # jose (and the crypto backends it loads) is imported on first use to keep startup fast
+    from jose import jwt
+
     return jwt.encode(encode, SECRET_KEY, algorithm)
 
 
 def validate_token(token: str):
+    with timed("jwt"):
+        return _validate_token(token)
+
+
+def _validate_token(token: str):
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = _decode_token(token)
+    # Checked on cache hits too, so a revoked token stops working at once
+    if claims['epoch'] < token_epochs.get(claims['user_id']):
+        raise ValidateTokenError(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked, please generate a new one"
+        )
+    return claims
+
+
+def _decode_token(token: str):
+    from jose import jwt, JWTError
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[algorithm])
         user_name = payload.get('sub')
@@ -38,7 +190,11 @@ def validate_token(token: str):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token"
             )
-        return {'user_name': user_name, 'user_id': user_id}
+        # Tokens issued before epochs existed count as epoch 0
+        claims = {'user_name': user_name, 'user_id': user_id, 'epoch': payload.get('epoch', 0)}
+        if payload.get('exp') is not None:
+            token_cache.put(token, claims, payload['exp'])
+        return claims
 
     except ValidateTokenError as exc:
         raise exc
@@ -50,17 +206,82 @@ def validate_token(token: str):
         )
 
 
-def get_todo(db, model, todo_id, user_id):
-    try:
-        details = db.query(model).filter(
-            and_(
-                model.id == todo_id,
-                model.owner_id == user_id
-            )
-        ).one()
-        return details
-    except Exception as e:
-        raise e
+# Column-only reads: rows come back as plain tuples, skipping ORM instances and the identity map
+TODO_COLUMNS = (
+    Todos.id, Todos.title, Todos.description, Todos.priority, Todos.complete, Todos.owner_id, Todos.revision,
+    Todos.updated_at
+)
+
+
+def todo_statement(todo_id, user_id):
+    return select(*TODO_COLUMNS).where(
+        and_(
+            Todos.owner_id == user_id,
+            Todos.id == todo_id
+        )
+    )
+
+
+def todos_page_statement(user_id, limit, cursor=None, complete=None, min_priority=None, max_priority=None,
+                         title_prefix=None):
+    statement = select(*TODO_COLUMNS).where(Todos.owner_id == user_id)
+    if cursor is not None:
+        statement = statement.where(Todos.id > cursor)
+    if complete is not None:
+        statement = statement.where(Todos.complete == complete)
+    if min_priority is not None:
+        statement = statement.where(Todos.priority >= min_priority)
+    if max_priority is not None:
+        statement = statement.where(Todos.priority <= max_priority)
+    if title_prefix:
+        # LIKE ignores case on SQLite but not on PostgreSQL; lower() both sides so every backend matches alike
+        statement = statement.where(func.lower(Todos.title).startswith(title_prefix.lower(), autoescape=True))
+
+    # Fetch one extra row to know whether another page exists
+    return statement.order_by(Todos.id).limit(limit + 1)
+
+
+def users_statement(cursor=None, with_todo_count=False):
+    """Public user columns in id order, optionally with each user's todo count.
+
+    The count comes from the todo_stats counters in the same statement (one outer join on the
+    primary key), so neither a per-user query nor a scan of todos is needed.
+    """
+    columns = [Users.id, Users.user_name, Users.email]
+    if with_todo_count:
+        columns.append(func.coalesce(TodoStats.total, 0).label("todo_count"))
+    statement = select(*columns)
+    if with_todo_count:
+        statement = statement.outerjoin(TodoStats, TodoStats.owner_id == Users.id)
+    if cursor is not None:
+        statement = statement.where(Users.id > cursor)
+    return statement.order_by(Users.id)
+
+
+def split_page(rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return rows, next_cursor
+
+
+def todo_etag(user_id, version, request):
+    """Weak ETag for a todo read: the owner's write version plus the query (minus the token).
+
+    Including the query keeps different pages and filters apart; the token is left out so
+    a client keeps its ETags across logins.
+    """
+    query = sorted((key, value) for key, value in request.query_params.multi_items() if key != "token")
+    digest = hashlib.sha256(f"{request.url.path}?{query}".encode()).hexdigest()[:16]
+    return f'W/"{user_id}-{version}-{digest}"'
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
 
 
 def validate_user_id_and_token(token, user_id):